@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gen_uvm_block_diagram import DrawClass, Layout, SVClass, SourceDiscovery, TextMetrics
+from gen_uvm_block_diagram.Canvas import peak_rss
+from gen_uvm_block_diagram.Layout import tree_hash
+from gen_uvm_block_diagram.parsers import get_backend
+
+from gen_testbench import Testbench
+
+
+class Benchmark:
+    """Time each stage of the diagram generation on a synthetic testbench
+
+    Every stage is run repeat times from the same input, the best wall and
+    cpu times are kept. With memory, peak_memory is the python heap peak of
+    the stage measured by tracemalloc (0 otherwise), it does not include
+    memory of worker processes or of the PIL image buffers. tracemalloc
+    slows python code down, times are best measured without it.
+    """
+
+    def __init__(self, repeat=1, memory=False):
+        self.repeat = repeat
+        self.memory = memory
+        self.stages = {}
+
+    def stage(self, name, fn, setup=None):
+        best = None
+        for _ in range(self.repeat):
+            if setup:
+                setup()
+            if self.memory:
+                tracemalloc.start()
+            wall, cpu = time.perf_counter(), time.process_time()
+            try:
+                result = fn()
+            except Exception as e:
+                if self.memory:
+                    tracemalloc.stop()
+                self.stages[name] = {"error": f"{type(e).__name__}: {e}"}
+                return None
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            peak = 0
+            if self.memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            if best is None or wall < best["wall"]:
+                best = {"wall": wall, "cpu": cpu, "peak_memory": peak}
+        self.stages[name] = best
+        return result
+
+
+def run(args):
+    bench = Benchmark(args.repeat, args.memory)
+    directory = args.dir or tempfile.mkdtemp(prefix="uvm_tb_")
+    tb = Testbench(args.agents, args.depth, args.fanout, args.chain)
+    top = bench.stage("generate", lambda: tb.write(directory))
+
+    def discover():
+        discovery = SourceDiscovery()
+        discovery.add(top)
+        return discovery.sources()
+    sources = bench.stage("discovery", discover)
+
+    results = None
+    for backend in args.backends:
+        for jobs in args.jobs:
+            def parse():
+                return get_backend(backend).parse_files(sources, SVClass.exclude, jobs)
+            name = f"parse.{backend}" if len(args.jobs) == 1 else f"parse.{backend}.j{jobs}"
+            r = bench.stage(name, parse)
+            if results is None:
+                results = r
+    if results is None:
+        return bench, {}
+
+    def reset_registry():
+        SVClass.classes = {}
+        SVClass.files = {}
+        SVClass._nodes = {}
+
+    def registry():
+        for file, class_infos in results.items():
+            SVClass.add_classes(class_infos, file)
+    bench.stage("registry", registry, reset_registry)
+
+    root = SVClass.classes["tb_test"]
+    tree = bench.stage("get_tree", root.get_tree, SVClass._nodes.clear)
+    layout = bench.stage("layout", lambda: DrawClass(tree).layout(), Layout.cache.clear)
+
+    def reset_text():
+        TextMetrics.extents.clear()
+        TextMetrics.fits.clear()
+    png = bench.stage("render", lambda: DrawClass(tree).render('png'), reset_text)
+    info = {
+        "files": len(sources),
+        "classes": len(SVClass.classes),
+        "boxes": len(layout) if layout is not None else None,
+        "tree_hash": tree_hash(tree),
+        "png_bytes": len(png) if png is not None else None,
+    }
+    return bench, info
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the stages of gen_uvm_block_diagram")
+    parser.add_argument('-n', '--agents', type=int, default=64, help="number of agents")
+    parser.add_argument('-d', '--depth', type=int, default=3, help="depth of the env tree")
+    parser.add_argument('-F', '--fanout', type=int, default=4, help="sub-envs of each non leaf env")
+    parser.add_argument('-c', '--chain', type=int, default=2, help="base classes of each monitor and driver")
+    parser.add_argument('-b', '--backends', default='verible,tree_sitter',
+                        help="comma separated parser backends, the first one that works feeds the next stages")
+    parser.add_argument('-j', '--jobs', default='1',
+                        help="comma separated parsing jobs, each backend is timed with each of them")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="runs of each stage, the best is kept")
+    parser.add_argument('--memory', action='store_true',
+                        help="measure python heap peaks with tracemalloc, slows the stages down")
+    parser.add_argument('--dir', help="write the testbench here instead of a temporary directory")
+    parser.add_argument('-o', '--output', help="write the json report here instead of stdout")
+    args = parser.parse_args()
+    args.backends = [b for b in args.backends.split(',') if b]
+    args.jobs = [int(j) for j in args.jobs.split(',') if j]
+
+    bench, info = run(args)
+    report = {
+        "config": {k: getattr(args, k) for k in ("agents", "depth", "fanout", "chain", "backends", "jobs", "repeat")},
+        "python": platform.python_version(),
+        "verible": get_backend("verible").version(),
+        **info,
+        "peak_rss_kb": peak_rss(),
+        "stages": bench.stages,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+
+
+class Testbench:
+    """Synthetic UVM testbench to measure how the diagram generator scales
+
+    A test instantiates a tree of envs of the given depth, each non leaf
+    env has fanout sub-envs and the agents are spread over the leaf envs.
+    Monitors are parameterized classes used as monitor_<i>#(0), monitors
+    and drivers extend chains of base classes, and every file `includes
+    the files of the classes it instantiates.
+    """
+
+    def __init__(self, agents=8, depth=2, fanout=2, chain=2):
+        self.agents = agents
+        self.depth = max(1, depth)
+        self.fanout = max(1, fanout)
+        self.chain = max(1, chain)
+        self.files = {}
+
+    @staticmethod
+    def component(name, base, properties, includes=(), params=""):
+        lines = [f'`include "{i}"' for i in includes]
+        lines += [
+            f"class {name}{params} extends {base};",
+            f"  `uvm_component_utils({name})",
+            "",
+        ]
+        lines += [f"  {type} {var};" for type, var in properties]
+        lines += [
+            "",
+            "  function new(string name, uvm_component parent);",
+            "    super.new(name, parent);",
+            "  endfunction",
+            "endclass",
+            "",
+        ]
+        return "\n".join(lines)
+
+    def generate(self):
+        """Return {file name: content}, tb_pkg.sv is the top file"""
+        files = {}
+        base = []
+        for kind in ("monitor", "driver"):
+            parent = f"uvm_{kind}"
+            for k in range(self.chain):
+                base.append(self.component(f"tb_{kind}_base_{k}", parent, []))
+                parent = f"tb_{kind}_base_{k}"
+        base.append(self.component("tb_scoreboard", "uvm_scoreboard", []))
+        files["tb_base.svh"] = "\n".join(base)
+        last = self.chain - 1
+        for i in range(self.agents):
+            files[f"monitor_{i}.svh"] = self.component(
+                f"monitor_{i}", f"tb_monitor_base_{last}", [], ["tb_base.svh"],
+                " #(parameter PASSIVE=0)")
+            files[f"driver_{i}.svh"] = self.component(
+                f"driver_{i}", f"tb_driver_base_{last}", [], ["tb_base.svh"])
+            files[f"agent_{i}.svh"] = self.component(
+                f"agent_{i}", "uvm_agent",
+                [(f"monitor_{i}#(0)", "m_monitor"), (f"driver_{i}", "m_driver"),
+                 ("uvm_sequencer#(uvm_sequence_item)", "m_sequencer")],
+                [f"monitor_{i}.svh", f"driver_{i}.svh"])
+        # envs named after their path in the env tree, agents round robin
+        leaves = [[0]]
+        for _ in range(self.depth - 1):
+            leaves = [p + [k] for p in leaves for k in range(self.fanout)]
+        env_agents = {tuple(p): [] for p in leaves}
+        for i in range(self.agents):
+            env_agents[tuple(leaves[i % len(leaves)])].append(i)
+        todo = [[0]]
+        while todo:
+            path = todo.pop()
+            name = "env_" + "_".join(map(str, path))
+            if len(path) < self.depth:
+                subs = [path + [k] for k in range(self.fanout)]
+                todo += subs
+                sub_names = ["env_" + "_".join(map(str, p)) for p in subs]
+                files[f"{name}.svh"] = self.component(
+                    name, "uvm_env", [(s, f"m_{s}") for s in sub_names],
+                    [f"{s}.svh" for s in sub_names])
+            else:
+                agents = env_agents[tuple(path)]
+                files[f"{name}.svh"] = self.component(
+                    name, "uvm_env",
+                    [(f"agent_{i}", f"m_agent_{i}") for i in agents]
+                    + [("tb_scoreboard", "m_scoreboard")],
+                    [f"agent_{i}.svh" for i in agents] + ["tb_base.svh"])
+        files["tb_pkg.sv"] = "\n".join([
+            "package tb_pkg;",
+            "  import uvm_pkg::*;",
+            '  `include "env_0.svh"',
+            "",
+            self.component("tb_test", "uvm_test", [("env_0", "m_env")]),
+            "endpackage",
+            "",
+        ])
+        return files
+
+    def write(self, directory):
+        """Write the testbench to directory, return the path of its top file"""
+        os.makedirs(directory, exist_ok=True)
+        for name, content in self.generate().items():
+            with open(os.path.join(directory, name), 'w') as f:
+                f.write(content)
+        return os.path.join(directory, "tb_pkg.sv")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic UVM testbench")
+    parser.add_argument('directory', help="output directory")
+    parser.add_argument('-n', '--agents', type=int, default=8, help="number of agents")
+    parser.add_argument('-d', '--depth', type=int, default=2, help="depth of the env tree")
+    parser.add_argument('-F', '--fanout', type=int, default=2, help="sub-envs of each non leaf env")
+    parser.add_argument('-c', '--chain', type=int, default=2, help="base classes of each monitor and driver")
+    args = parser.parse_args()
+    top = Testbench(args.agents, args.depth, args.fanout, args.chain).write(args.directory)
+    print(top)
@@ -0,0 +1,105 @@
+import os
+
+from .DrawClass import DrawClass
+from .SVClass import SVClass
+from .TextMetrics import TextMetrics
+from .Trace import Trace
+
+
+def _init_worker(classes, exclude, font_path, traced=False):
+    # the class graph is sent once per worker, trees are built in the worker
+    # and their shared nodes are reused from one root to the next
+    SVClass.classes = classes
+    SVClass.exclude = exclude
+    SVClass._nodes = {}
+    TextMetrics.font_path = font_path
+    Trace.init_worker(traced)
+
+
+def _render(root, path, font_size=12):
+    try:
+        DrawClass(SVClass.classes[root].get_tree(), font_size=font_size).save(path)
+    except Exception as e:
+        return root, path, f"{type(e).__name__}: {e}"
+    return root, path, None
+
+
+def _render_job(root, path, font_size=12):
+    # in a worker process, the trace goes back with the result
+    return _render(root, path, font_size), Trace.drain()
+
+
+class BatchRender:
+    """Render one diagram per root class from one parsed class graph
+
+    Diagrams are rendered on a pool of processes sharing SVClass.classes,
+    an index.html listing them is written next to them.
+    """
+
+    root_types = ("uvm_test", "uvm_env")
+
+    def __init__(self, directory, format="png", jobs=1, font_size=12):
+        self.directory = directory
+        self.format = format
+        self.jobs = jobs
+        self.font_size = font_size
+
+    @classmethod
+    def roots(cls, classes, unreferenced=False):
+        """Names of the root candidates in classes
+
+        uvm_test/uvm_env subclasses, directly or through other classes, or
+        with unreferenced=True the classes no other class has a property of.
+        """
+        if unreferenced:
+            referenced = {p[0] for c in classes.values() for p in c.properties}
+            return [n for n, c in classes.items()
+                    if n not in referenced and c.name not in SVClass.exclude
+                    and c.type not in SVClass.exclude]
+        roots = []
+        for name, c in classes.items():
+            seen = set()
+            base = c
+            while base and base.type not in seen:
+                if base.type in cls.root_types:
+                    roots.append(name)
+                    break
+                seen.add(base.type)
+                base = classes.get(base.type)
+        return roots
+
+    def path(self, root):
+        return os.path.join(self.directory, f"{root}.{self.format}")
+
+    def run(self, roots):
+        """Render roots, returns [(root, path, error)] in roots order"""
+        os.makedirs(self.directory, exist_ok=True)
+        paths = [self.path(r) for r in roots]
+        if self.jobs <= 1 or len(roots) <= 1:
+            results = [_render(r, p, self.font_size) for r, p in zip(roots, paths)]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker,
+                                     initargs=(SVClass.classes, SVClass.exclude,
+                                               TextMetrics.font_path, Trace.enabled)) as executor:
+                results = []
+                for result, trace in executor.map(_render_job, roots, paths,
+                                                  [self.font_size] * len(roots)):
+                    results.append(result)
+                    Trace.merge(trace)
+        self.write_index(results)
+        return results
+
+    def write_index(self, results):
+        from html import escape
+        with open(os.path.join(self.directory, "index.html"), 'w') as f:
+            f.write("<!DOCTYPE html>\n<html><head><title>UVM block diagrams</title></head><body>\n<ul>\n")
+            for root, path, error in results:
+                name = escape(root)
+                if error:
+                    f.write(f'<li>{name}: {escape(error)}</li>\n')
+                    continue
+                c = SVClass.classes[root]
+                f.write(f'<li><a href="{escape(os.path.basename(path))}">{name}</a> '
+                        f'({escape(c.type)}, {escape(c.file or "")})</li>\n')
+            f.write("</ul>\n</body></html>\n")
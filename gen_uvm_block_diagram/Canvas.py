@@ -0,0 +1,186 @@
+import os
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# xml.sax.saxutils.escape, without importing urllib
+_escape = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+
+def hex_to_rgb(color):
+    color = color.lstrip('#')
+    return tuple(int(color[i:i+2], 16) for i in (0, 2, 4))
+
+
+def canvas_for(path, w, h):
+    """Vector canvas streaming to path, by extension, None for raster formats"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.svg':
+        return SVGCanvas(path, w, h)
+    if ext == '.pdf':
+        return PDFCanvas(path, w, h)
+    return None
+
+
+def peak_rss():
+    """Peak resident memory of the process in kB, None where unknown"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class RasterCanvas:
+    """Draw on a PIL image held in memory"""
+
+    # PIL format and default options of each encoder, raw is the RGB buffer
+    encoders = {
+        'png': ('PNG', {'compress_level': 6}),
+        'webp': ('WEBP', {'quality': 90}),
+        'raw': (None, {}),
+    }
+
+    def __init__(self, w, h):
+        # PIL is imported by the first raster diagram, not by the package
+        from PIL import Image, ImageDraw
+        self.img = Image.new("RGB", (w, h))
+        # one draw context for every shape of the image
+        self.draw = ImageDraw.Draw(self.img)
+
+    def rectangle(self, coords, fill, outline):
+        self.draw.rectangle(coords, fill=fill, outline=outline)
+
+    def text(self, xy, text, fill, font):
+        self.draw.text(xy, text, fill=fill, font=font)
+
+    def close(self):
+        pass
+
+    def nbytes(self):
+        """Size of the pixel buffer, PIL keeps RGB pixels on 4 bytes"""
+        return self.img.width * self.img.height * 4
+
+    def encode(self, fp, format='png', **options):
+        """Write the image to fp, a path or a binary file object
+
+        options override the encoder defaults. Returns the number of bytes
+        written, None when fp cannot tell.
+        """
+        if format not in self.encoders:
+            raise ValueError(f"unknown format {format}, expected one of {', '.join(self.encoders)}")
+        pil_format, defaults = self.encoders[format]
+        is_path = isinstance(fp, (str, os.PathLike))
+        try:
+            start = None if is_path else fp.tell()
+        except (AttributeError, OSError):
+            start = None
+        if pil_format is None:
+            if is_path:
+                with open(fp, 'wb') as f:
+                    f.write(self.img.tobytes())
+            else:
+                fp.write(self.img.tobytes())
+        else:
+            self.img.save(fp, format=pil_format, **{**defaults, **options})
+        if is_path:
+            return os.path.getsize(fp)
+        return fp.tell() - start if start is not None else None
+
+
+class SVGCanvas:
+    """Stream SVG elements to a file as they are drawn
+
+    Uses the raster pixel coordinates, a rectangle covers the same pixels
+    as its PIL counterpart.
+    """
+
+    def __init__(self, path, w, h):
+        # path, or a text file object left open by close()
+        self.owned = isinstance(path, (str, os.PathLike))
+        self.f = open(path, 'w') if self.owned else path
+        self.f.write(
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}" '
+            f'viewBox="0 0 {w} {h}" font-family="DejaVu Sans Mono, monospace">\n'
+            f'<rect width="{w}" height="{h}" fill="#000000"/>\n')
+
+    def rectangle(self, coords, fill, outline):
+        ((x0, y0), (x1, y1)) = coords
+        if x1 < x0 or y1 < y0:
+            return
+        self.f.write(
+            f'<rect x="{x0+0.5}" y="{y0+0.5}" width="{x1-x0}" height="{y1-y0}" '
+            f'fill="{fill}" stroke="{outline}"/>\n')
+
+    def text(self, xy, text, fill, font):
+        self.f.write(
+            f'<text x="{xy[0]}" y="{xy[1]}" font-size="{font.size}" '
+            f'dominant-baseline="text-before-edge" fill="{fill}">{text.translate(_escape)}</text>\n')
+
+    def close(self):
+        self.f.write('</svg>\n')
+        if self.owned:
+            self.f.close()
+
+
+class PDFCanvas:
+    """Stream a single page PDF to a file as it is drawn
+
+    The page content stream is written incrementally, its length and the
+    cross-reference table are written on close().
+    """
+
+    def __init__(self, path, w, h):
+        # path, or an empty binary file object left open by close()
+        self.owned = isinstance(path, (str, os.PathLike))
+        self.f = open(path, 'wb') if self.owned else path
+        self.h = h
+        self.offsets = []
+        self.f.write(b'%PDF-1.4\n')
+        self.write_object(b'<< /Type /Catalog /Pages 2 0 R >>')
+        self.write_object(b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>')
+        self.write_object(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {w} {h}] '
+            f'/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>'.encode())
+        self.write_object(b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>')
+        self.offsets.append(self.f.tell())
+        self.f.write(b'5 0 obj\n<< /Length 6 0 R >>\nstream\n')
+        self.stream_start = self.f.tell()
+        self.f.write(f'0 0 0 rg 0 0 {w} {h} re f\n'.encode())
+
+    def write_object(self, body):
+        self.offsets.append(self.f.tell())
+        self.f.write(f'{len(self.offsets)} 0 obj\n'.encode() + body + b'\nendobj\n')
+
+    @staticmethod
+    def color(color, op):
+        r, g, b = hex_to_rgb(color)
+        return f'{r/255:.3f} {g/255:.3f} {b/255:.3f} {op}'
+
+    def rectangle(self, coords, fill, outline):
+        ((x0, y0), (x1, y1)) = coords
+        if x1 < x0 or y1 < y0:
+            return
+        self.f.write(
+            f'{self.color(fill, "rg")} {self.color(outline, "RG")} '
+            f'{x0+0.5} {self.h-y1-0.5} {x1-x0} {y1-y0} re B\n'.encode())
+
+    def text(self, xy, text, fill, font):
+        text = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        self.f.write(
+            f'BT {self.color(fill, "rg")} /F1 {font.size} Tf '
+            f'{xy[0]} {self.h-xy[1]-0.8*font.size:.1f} Td ({text}) Tj ET\n'
+            .encode('latin-1', 'replace'))
+
+    def close(self):
+        length = self.f.tell() - self.stream_start
+        self.f.write(b'endstream\nendobj\n')
+        self.write_object(str(length).encode())
+        xref = self.f.tell()
+        self.f.write(f'xref\n0 {len(self.offsets)+1}\n0000000000 65535 f \n'.encode())
+        for offset in self.offsets:
+            self.f.write(f'{offset:010d} 00000 n \n'.encode())
+        self.f.write(f'trailer\n<< /Size {len(self.offsets)+1} /Root 1 0 R >>\n'
+                     f'startxref\n{xref}\n%%EOF\n'.encode())
+        if self.owned:
+            self.f.close()
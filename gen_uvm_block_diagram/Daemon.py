@@ -0,0 +1,256 @@
+import errno
+import functools
+import json
+import os
+import socket
+import stat
+import sys
+import threading
+import time
+
+from .BatchRender import BatchRender
+from .Canvas import peak_rss
+from .DrawClass import DrawClass
+from .Layout import Layout
+from .SVClass import SVClass
+from .TextMetrics import TextMetrics
+from .Trace import Trace
+
+
+@functools.lru_cache(maxsize=None)
+def _server_classes():
+    """(handler, TCP server, unix socket server) classes
+
+    http.server takes longer to import than the rest of the package, it is
+    only imported when a daemon starts serving.
+    """
+    import socketserver
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            status, content_type, body = self.server.owner.handle(self.path)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def address_string(self):
+            # unix socket clients have no address
+            return self.client_address[0] if self.client_address else "unix"
+
+        def log_message(self, format, *args):
+            if self.server.owner.verbose:
+                super().log_message(format, *args)
+
+    class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+    return Handler, ThreadingHTTPServer, UnixHTTPServer
+
+
+class Daemon:
+    """Serve diagrams of a class graph kept in memory
+
+    The classes, their shared tree nodes, the layout cache and the fonts
+    stay loaded between requests, so a request only lays out and draws
+    what changed. Changed files are re-parsed on /refresh, on a request
+    with refresh=1, or every watcher.interval with watch(). The class graph
+    is only touched under a lock, layouts and drawing run concurrently.
+
+    GET /tree?root=NAME&format=txt|png|webp|raw|svg|pdf&path=A/B&zoom=X0,Y0,X1,Y1&min_box=N
+    GET /refresh, /roots, /stats
+    """
+
+    formats = {
+        "txt": "text/plain; charset=utf-8",
+        "png": "image/png",
+        "webp": "image/webp",
+        "raw": "application/octet-stream",
+        "svg": "image/svg+xml",
+        "pdf": "application/pdf",
+    }
+
+    def __init__(self, watcher, jobs=1, cache=None, font_size=12, min_box=8, verbose=False):
+        self.watcher = watcher
+        self.jobs = jobs
+        self.cache = cache
+        self.font_size = font_size
+        self.min_box = min_box
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.started = time.time()
+        self.stats = {"requests": 0, "errors": 0, "refreshes": 0, "classes updated": 0}
+        self.server = None
+
+    def count(self, name, n=1):
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def refresh(self):
+        """Re-parse the files changed since the previous refresh
+
+        Returns (changed, removed, stale class names).
+        """
+        with self.lock:
+            changed, removed = self.watcher.poll()
+            stale = set()
+            if changed or removed:
+                with Trace.span("refresh", files=len(changed) + len(removed)):
+                    stale = SVClass.update_files(changed, removed, jobs=self.jobs, cache=self.cache)
+                    if self.watcher.discovery is not None:
+                        SVClass.set_origins(self.watcher.discovery)
+        self.count("refreshes")
+        self.count("classes updated", len(stale))
+        return changed, removed, stale
+
+    def watch(self):
+        """Refresh every watcher.interval in a background thread"""
+        def run():
+            while True:
+                time.sleep(self.watcher.interval)
+                self.refresh()
+        threading.Thread(target=run, name="refresh", daemon=True).start()
+
+    def tree(self, root, path=None):
+        """Tree of root, or of its subtree at path, None for an unknown root"""
+        with self.lock:
+            c = SVClass.classes.get(root)
+            if c is None:
+                return None
+            # nodes are shared and never modified, the tree stays valid
+            # after a refresh replaced them
+            tree = c.get_tree()
+        return DrawClass.sub_tree(tree, path) if path else tree
+
+    def render(self, tree, format, zoom=None, min_box=None):
+        if format == "txt":
+            return ''.join(line + '\n' for line in SVClass.tree_lines(tree)).encode("utf8")
+        dc = DrawClass(tree, font_size=self.font_size)
+        dc.min_box_size = self.min_box if min_box is None else min_box
+        dc.region = zoom
+        return dc.render(format)
+
+    def handle(self, url):
+        """Return (status, content type, body) of a GET of url"""
+        from urllib.parse import parse_qs, urlsplit
+        self.count("requests")
+        url = urlsplit(url)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            with Trace.span("request", path=url.path):
+                if url.path == "/tree":
+                    return self.get_tree(query)
+                if url.path == "/refresh":
+                    changed, removed, stale = self.refresh()
+                    return self.json({"changed": changed, "removed": removed, "stale": sorted(stale)})
+                if url.path == "/roots":
+                    with self.lock:
+                        roots = BatchRender.roots(SVClass.classes, query.get("unreferenced") == "1")
+                    return self.json(roots)
+                if url.path == "/stats":
+                    return self.json(self.get_stats())
+                return self.error(404, f"unknown endpoint {url.path}")
+        except Exception as e:
+            return self.error(500, f"{type(e).__name__}: {e}")
+
+    def get_tree(self, query):
+        format = query.get("format", "txt")
+        if format not in self.formats:
+            return self.error(400, f"unknown format {format}, expected one of {', '.join(self.formats)}")
+        try:
+            zoom = tuple(int(v) for v in query["zoom"].split(',')) if "zoom" in query else None
+            min_box = int(query["min_box"]) if "min_box" in query else None
+        except ValueError as e:
+            return self.error(400, str(e))
+        if zoom is not None and (len(zoom) != 4 or zoom[2] <= zoom[0] or zoom[3] <= zoom[1]):
+            return self.error(400, f"bad zoom region {query['zoom']}")
+        if query.get("refresh") == "1":
+            self.refresh()
+        root = query.get("root")
+        if root is None:
+            return self.error(400, "missing root parameter")
+        tree = self.tree(root, query.get("path"))
+        if tree is None:
+            return self.error(404, f"unknown root class {root}")
+        if not tree:
+            return self.error(404, f"no path {query['path']} below {root}")
+        return 200, self.formats[format], self.render(tree, format, zoom, min_box)
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "uptime": time.time() - self.started,
+            "classes": len(SVClass.classes),
+            "files": len(SVClass.files),
+            "layouts cached": len(Layout.cache),
+            "text extents cached": len(TextMetrics.extents),
+            "peak_rss_kb": peak_rss(),
+            **(Trace.metrics() if Trace.enabled else {}),
+        }
+
+    @staticmethod
+    def json(data):
+        return 200, "application/json", json.dumps(data, indent=2).encode("utf8")
+
+    def error(self, status, message):
+        self.count("errors")
+        return status, "text/plain; charset=utf-8", (message + '\n').encode("utf8")
+
+    @staticmethod
+    def remove_stale_socket(path):
+        """Remove the unix socket at path if no daemon answers on it
+
+        Raises FileExistsError when path is not a socket, OSError with
+        EADDRINUSE when a daemon is serving on it.
+        """
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise FileExistsError(errno.EEXIST, "not a socket, refusing to replace it", path)
+        with socket.socket(socket.AF_UNIX) as s:
+            try:
+                s.connect(path)
+            except ConnectionRefusedError:
+                os.unlink(path)
+                return
+        raise OSError(errno.EADDRINUSE, "a daemon is already serving on it", path)
+
+    def serve(self, address):
+        """Serve forever on address
+
+        address is [HOST:]PORT for TCP or a unix socket path, which has to
+        contain a / (./daemon.sock). A stale socket at the path is
+        replaced, the socket is removed on exit.
+        """
+        handler, tcp_server, unix_server = _server_classes()
+        unix = '/' in address
+        if not unix:
+            host, _, port = address.rpartition(':')
+            if not port.isdigit():
+                raise ValueError(f"bad address {address}, expected [HOST:]PORT or a unix socket path with a /")
+            self.server = tcp_server((host or "localhost", int(port)), handler)
+        else:
+            self.remove_stale_socket(address)
+            self.server = unix_server(address, handler)
+            bound = os.lstat(address)
+        self.server.owner = self
+        print(f"serving on {address}", file=sys.stderr)
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if unix:
+                # only remove our socket, not one bound since by another daemon
+                try:
+                    st = os.lstat(address)
+                except FileNotFoundError:
+                    st = None
+                if st and (st.st_dev, st.st_ino) == (bound.st_dev, bound.st_ino):
+                    os.unlink(address)
@@ -1,16 +1,40 @@
-from PIL import Image, ImageDraw, ImageFont
+import io
+import os
+import time
+
+from .Canvas import PDFCanvas, RasterCanvas, SVGCanvas, canvas_for
+from .Layout import Layout
+from .TextMetrics import TextMetrics
+from .Trace import Trace
 
 
 class DrawClass:
     """Draw block diagram based on a class tree"""
 
-    def __init__(self, class_tree):
+    # measure the python heap peak of render() with tracemalloc, slows the
+    # allocations of the whole process while rendering
+    trace_memory = False
+
+    def __init__(self, class_tree, canvas=None, font_path=None, font_size=12):
         self.w, self.h = 1920, 1080
         self.margin = 10
         self.root_coords = ((0, 0), (self.w-1, self.h-1))
-        self.img = Image.new("RGB", (self.w, self.h))
-        self.font = ImageFont.truetype("/home/antoine/.fonts/DejaVuSansMono/DejaVu Sans Mono Nerd Font Complete.ttf", 12)
+        # raster canvas allocated on first draw unless a canvas is given
+        self.canvas = canvas
+        # labels wider or taller than their box are shrunk down to
+        # min_font_size, then truncated or dropped
+        self.font_path = font_path
+        self.font_size = font_size
+        self.min_font_size = 9
+        self.font = TextMetrics.font(font_size, font_path)
         self.class_tree = class_tree
+        # subtrees whose box is smaller than min_box_size pixels are summarized
+        self.min_box_size = 8
+        # (x0, y0, x1, y1) part of the diagram drawn over the whole canvas, at
+        # full detail, None for the whole diagram
+        self.region = None
+        # timings and sizes of the last render()
+        self.stats = {}
         self.type_colors = {
             "uvm_test": "#928374",
             "uvm_env": "#80aa9e",
@@ -35,85 +59,146 @@ class DrawClass:
             'outline': '#32302f',
         }
 
-    @staticmethod
-    def flip_xy_coord(c):
-        return ((c[0][1], c[0][0]), (c[1][1], c[1][0]))
+    @property
+    def img(self):
+        if self.canvas is None:
+            self.canvas = RasterCanvas(self.w, self.h)
+        return self.canvas.img
 
     def draw(self, coords, text, color=""):
         c_backgroud = color if color else self.default_colors['backgroud']
         c_outline = self.default_colors['outline']
         c_text = self.default_colors['text']
-        img1 = ImageDraw.Draw(self.img)
-        img1.rectangle(coords, fill=c_backgroud, outline=c_outline)
-        img1.text((coords[0][0]+self.margin/2, coords[0][1]), text, fill=c_text, font=self.font)
-
-    def get_sibling_coords(self, parent_coords, tree, no_margin=False):
-        coords = [((0, 0), (0, 0))]*len(tree)
-        idx_top = []
-        idx_mini = []
-        idx_middle = []
-        for i,sibling in enumerate(tree):
-            type_position = self.type_position.get(sibling['type'], 'mini')
-            if type_position == "top":
-                idx_top.append(i)
-            elif type_position == "mini":
-                idx_mini.append(i)
-            elif type_position == "middle":
-                idx_middle.append(i)
-        if idx_top:
-            div3_coords = self.divide_rectangle(
-                parent_coords, 3, no_margin, y_div=True)
-            top_parent_coords = div3_coords[0]
-            parent_coords = (div3_coords[1][0], div3_coords[2][1])
-            top_coords = self.divide_rectangle(
-                top_parent_coords, len(idx_top), no_margin)
-            for i in idx_top:
-                coords[i] = top_coords.pop(0)
-        if idx_mini:
-            ((x0, y0), (x1, y1)) = parent_coords
-            mini_parent_coords = ((x0, y0+self.margin), (x1, y0+self.margin+30*len(idx_mini)))
-            parent_coords = ((x0, y0+30*len(idx_mini)), (x1, y1))
-            mini_coords = self.divide_rectangle(
-                mini_parent_coords, len(idx_mini), no_margin)
-            for i in idx_mini:
-                coords[i] = mini_coords.pop(0)
-        if idx_middle:
-            middle_coords = self.divide_rectangle(
-                parent_coords, len(idx_middle), no_margin)
-            for i in idx_middle:
-                coords[i] = middle_coords.pop(0)
-        return coords
-
-    def divide_rectangle(self, coords, nb, no_margin=False, y_div=False):
-        if y_div:
-            coords = self.flip_xy_coord(coords)
-        margin = self.margin if not no_margin else 0
-        ((x0, y0), (x1, y1)) = coords
-        dx = ((x1-x0-margin) // nb)
-        X0 = x0 + margin
-        Y0 = y0 + margin
-        Y1 = y1 - margin
-        new_coords = [((X0+dx*i, Y0), (X0+dx*(i+1)-margin, Y1))
-                      for i in range(nb)]
-        if y_div:
-            new_coords = [self.flip_xy_coord(c) for c in new_coords]
-        return new_coords
-
-    def draw_tree(self, tree=[], parent_coords=()):
-        is_root = parent_coords == ()
-        # root init
-        if is_root:
-            parent_coords = self.root_coords
-            tree = self.class_tree
-        # draw recursively
-        sibling_coords = self.get_sibling_coords(
-            parent_coords, tree, no_margin=is_root)
-        for i, sibling in enumerate(tree):
-            color = self.type_colors.get(sibling['type'], "")
-            self.draw(sibling_coords[i], f"{sibling['name']}", color)
-            properties = sibling['properties']
-            if len(properties):
-                self.draw_tree(properties, sibling_coords[i])
-        # show image when recursion is done
-        if is_root:
+        self.canvas.rectangle(coords, fill=c_backgroud, outline=c_outline)
+        width = coords[1][0] - coords[0][0] - self.margin
+        height = coords[1][1] - coords[0][1]
+        size, label = TextMetrics.fit(text, width, self.font_size, self.min_font_size,
+                                      self.font_path, height)
+        if label:
+            font = TextMetrics.font(size, self.font_path)
+            self.canvas.text((coords[0][0]+self.margin/2, coords[0][1]), label, fill=c_text, font=font)
+
+    @staticmethod
+    def sub_tree(tree, path):
+        """[node] reached through path, class names from the root separated
+        by '/', [] when there is no such node"""
+        node = None
+        nodes = tree
+        for name in path.strip('/').split('/'):
+            node = next((n for n in nodes if n['name'] == name), None)
+            if node is None:
+                return []
+            nodes = node['properties']
+        return [node] if node else []
+
+    def view(self):
+        """(w, h, dx, dy) size of the laid out diagram, offset of the region"""
+        if not self.region:
+            return self.w, self.h, 0, 0
+        x0, y0, x1, y1 = self.region
+        sx = self.w / max(1, x1 - x0)
+        sy = self.h / max(1, y1 - y0)
+        return round(self.w*sx), round(self.h*sy), round(x0*sx), round(y0*sy)
+
+    def layout(self):
+        w, h, _, _ = self.view()
+        return Layout.compute(self.class_tree, w, h, self.margin, self.type_position, self.min_box_size)
+
+    def draw_tree(self, show=True):
+        layout = self.layout()
+        if self.canvas is None:
+            self.canvas = RasterCanvas(self.w, self.h)
+        # parents first, children are drawn over them
+        _, _, dx, dy = self.view()
+        drawn = 0
+        with Trace.span("draw", canvas=type(self.canvas).__name__):
+            for i, _ in layout.pre_order():
+                ((x0, y0), (x1, y1)) = layout.coords(i)
+                x0, y0, x1, y1 = x0-dx, y0-dy, x1-dx, y1-dy
+                if x1 < 0 or y1 < 0 or x0 >= self.w or y0 >= self.h:
+                    continue
+                # outlines of boxes larger than the region stay out of the canvas
+                coords = ((max(x0, -1), max(y0, -1)), (min(x1, self.w), min(y1, self.h)))
+                color = self.type_colors.get(layout.type(i), "")
+                self.draw(coords, layout.names[i], color)
+                drawn += 1
+            self.canvas.close()
+        Trace.count("boxes drawn", drawn)
+        if show and isinstance(self.canvas, RasterCanvas):
             self.img.show()
+
+    def render(self, format='png', fp=None, **options):
+        """Draw without any display and encode the image
+
+        Returns the encoded bytes, or writes them to fp, a path or a binary
+        file object (a text one for svg). format is svg, pdf or one of
+        RasterCanvas.encoders, options are passed to the encoder:
+        compress_level for png, quality or lossless for webp.
+
+        stats then holds the draw and encode times, the encoded size, the
+        size of the pixel buffer and, with trace_memory, the python heap
+        peak of the render. tracemalloc peaks are process-wide, the ones
+        of concurrent renders include each other.
+        """
+        traced = self.trace_memory
+        if traced:
+            import tracemalloc
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            heap = tracemalloc.get_traced_memory()[0]
+        try:
+            out, size, draw_time, encode_time = self._render(format, fp, options)
+            peak_heap = tracemalloc.get_traced_memory()[1] - heap if traced else None
+        finally:
+            if traced and started:
+                tracemalloc.stop()
+        self.stats = {
+            'format': format,
+            'draw_time': draw_time,
+            'encode_time': encode_time,
+            'encoded_bytes': size,
+            'image_bytes': self.canvas.nbytes() if isinstance(self.canvas, RasterCanvas) else 0,
+            'peak_heap_bytes': peak_heap,
+        }
+        return out.getvalue() if fp is None else None
+
+    def _render(self, format, fp, options):
+        start = time.perf_counter()
+        if format in ('svg', 'pdf'):
+            out = (io.StringIO() if format == 'svg' else io.BytesIO()) if fp is None else fp
+            self.canvas = (SVGCanvas if format == 'svg' else PDFCanvas)(out, self.w, self.h)
+            self.draw_tree(show=False)
+            drawn = time.perf_counter()
+            size = None
+            if fp is None:
+                out = io.BytesIO(out.getvalue().encode('utf8')) if format == 'svg' else out
+                size = len(out.getvalue())
+        else:
+            if not isinstance(self.canvas, RasterCanvas):
+                self.canvas = RasterCanvas(self.w, self.h)
+            self.draw_tree(show=False)
+            drawn = time.perf_counter()
+            out = io.BytesIO() if fp is None else fp
+            with Trace.span("encode", format=format):
+                size = self.canvas.encode(out, format, **options)
+        return out, size, drawn - start, time.perf_counter() - drawn
+
+    def save(self, path):
+        """Render to path, .svg and .pdf are streamed, .txt lists the boxes,
+        .png, .webp and .raw use render(), other formats go through PIL"""
+        if path.endswith('.txt'):
+            with open(path, 'w') as f:
+                f.write(self.layout().to_text())
+            return
+        format = os.path.splitext(path)[1][1:].lower()
+        vector_canvas = canvas_for(path, self.w, self.h)
+        if vector_canvas:
+            self.canvas = vector_canvas
+            self.draw_tree(show=False)
+        elif format in RasterCanvas.encoders:
+            self.render(format, path)
+        else:
+            self.draw_tree(show=False)
+            self.img.save(path)
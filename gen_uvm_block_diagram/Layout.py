@@ -0,0 +1,287 @@
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+
+from .Trace import Trace
+
+
+def tree_hash(tree):
+    """Structural digest of a class tree, shared subtrees are hashed once"""
+    memo = {}
+
+    def digest(node):
+        d = memo.get(id(node))
+        if d is None:
+            h = hashlib.sha1(f"{node['name']}\0{node['type']}\0".encode("utf8"))
+            for child in node['properties']:
+                h.update(digest(child))
+            d = memo[id(node)] = h.digest()
+        return d
+
+    h = hashlib.sha1()
+    for node in tree:
+        h.update(digest(node))
+    return h.hexdigest()
+
+
+class Layout:
+    """Boxes of a class tree, independent of colors, fonts and output format
+
+    Boxes are computed level by level and stored in flat arrays: parent box
+    index (-1 for the top level), x0, y0, x1, y1 and type id, names[i] is
+    the label of box i. Layouts are cached by tree hash and geometry, so
+    rendering the same tree with another theme or to another format does
+    not place the boxes again.
+
+    Level of detail: siblings that would get a box smaller than min_size
+    pixels are replaced by one summary box per type, like "uvm_agent x 48",
+    and boxes smaller than min_size are not traversed further. A box whose
+    children are not drawn, because it is too small or because not even the
+    summary boxes fit in it, gets the number of components below it in its
+    label, like "env_3 (+120)".
+    """
+
+    cache = OrderedDict()
+    cache_size = 16
+    _lock = threading.Lock()
+
+    def __init__(self, w, h, margin, type_position, min_size=0):
+        self.w, self.h = w, h
+        self.margin = margin
+        self.type_position = type_position
+        self.min_size = min_size
+        self.parent = array('i')
+        self.x0 = array('i')
+        self.y0 = array('i')
+        self.x1 = array('i')
+        self.y1 = array('i')
+        self.type_id = array('i')
+        self.types = []
+        self.type_ids = {}
+        self.names = []
+        # id(node) -> number of nodes below it, for count labels
+        self._descendants = {}
+
+    @classmethod
+    def compute(cls, tree, w, h, margin, type_position, min_size=0):
+        key = (tree_hash(tree), w, h, margin, tuple(sorted(type_position.items())), min_size)
+        with cls._lock:
+            layout = cls.cache.get(key)
+            if layout is not None:
+                cls.cache.move_to_end(key)
+        if layout is not None:
+            Trace.count("layout cache hits")
+            return layout
+        layout = cls(w, h, margin, type_position, min_size)
+        with Trace.span("layout"):
+            layout.place(tree)
+        Trace.count("boxes laid out", len(layout))
+        with cls._lock:
+            cls.cache[key] = layout
+            if len(cls.cache) > cls.cache_size:
+                cls.cache.popitem(last=False)
+        return layout
+
+    def __len__(self):
+        return len(self.parent)
+
+    def place(self, tree):
+        # (parent box, siblings, parent coords, no margin) for each group of
+        # siblings of the current level
+        level = [(-1, tree, ((0, 0), (self.w-1, self.h-1)), True)]
+        while level:
+            level = self.place_level(level)
+
+    def place_level(self, level):
+        """Add the boxes of one level, return the groups of the next one"""
+        # coordinates of every group first. The division of a group only
+        # depends on the size of its parent box and on the positions of its
+        # types, groups of the same shape are divided once per level and
+        # translated
+        position = self.type_position
+        shapes = {}
+        groups = []
+        for parent, siblings, parent_coords, no_margin in level:
+            ((x0, y0), (x1, y1)) = parent_coords
+            key = (x1 - x0, y1 - y0, no_margin,
+                   tuple(position.get(s['type'], 'mini') for s in siblings))
+            shape = shapes.get(key)
+            if shape is None:
+                coords = self.get_sibling_coords(((0, 0), (x1 - x0, y1 - y0)), siblings, no_margin)
+                shape = shapes[key] = (coords, any(self.too_small(c) for c in coords),
+                                       any(self.empty(c) for c in coords))
+            coords, too_small, empty = shape
+            nodes = siblings
+            if len(siblings) > 1 and too_small:
+                siblings = self.summarize(siblings)
+                coords = self.get_sibling_coords(parent_coords, siblings, no_margin)
+                empty = any(self.empty(c) for c in coords)
+            elif x0 or y0:
+                coords = [((x0 + a, y0 + b), (x0 + c, y0 + d)) for ((a, b), (c, d)) in coords]
+            if parent >= 0 and empty:
+                # not even one box per type fits, the parent tells how
+                # many components it holds
+                self.names[parent] += self.count_label(nodes)
+                continue
+            groups.append((parent, siblings, coords))
+
+        # then all the boxes of the level at once
+        rows = [(parent, sibling, c) for parent, siblings, coords in groups
+                for sibling, c in zip(siblings, coords) if not self.empty(c)]
+        first = len(self)
+        self.add_boxes(rows)
+
+        next_level = []
+        for i, (_, sibling, c) in enumerate(rows, first):
+            if not sibling['properties']:
+                continue
+            if self.too_small(c):
+                self.names[i] += self.count_label(sibling['properties'])
+            else:
+                next_level.append((i, sibling['properties'], c, False))
+        return next_level
+
+    def count_label(self, nodes):
+        """Label suffix counting nodes and their descendants"""
+        return f" (+{sum(1 + self.descendants(n) for n in nodes)})"
+
+    def descendants(self, node):
+        """Number of nodes below node, shared subtrees counted once per use"""
+        counts = self._descendants
+        todo = [(node, False)]
+        while todo:
+            n, expanded = todo.pop()
+            if id(n) in counts:
+                continue
+            if expanded:
+                counts[id(n)] = sum(1 + counts[id(c)] for c in n['properties'])
+            else:
+                todo.append((n, True))
+                todo.extend((c, False) for c in n['properties'] if id(c) not in counts)
+        return counts[id(node)]
+
+    @staticmethod
+    def empty(coords):
+        """Whether a box covers no pixel"""
+        ((x0, y0), (x1, y1)) = coords
+        return x1 < x0 or y1 < y0
+
+    def too_small(self, coords):
+        ((x0, y0), (x1, y1)) = coords
+        return x1 - x0 < self.min_size or y1 - y0 < self.min_size
+
+    @staticmethod
+    def summarize(siblings):
+        """One leaf per type standing for all the siblings of that type"""
+        by_type = {}
+        for sibling in siblings:
+            by_type.setdefault(sibling['type'], []).append(sibling)
+        summary = []
+        for type, nodes in by_type.items():
+            if len(nodes) == 1:
+                summary.append(nodes[0])
+            else:
+                summary.append({'name': f"{type} x {len(nodes)}", 'type': type, 'properties': []})
+        return summary
+
+    def add_boxes(self, rows):
+        """Append (parent box, node, coords) rows"""
+        type_ids = self.type_ids
+        for _, node, _ in rows:
+            if node['type'] not in type_ids:
+                type_ids[node['type']] = len(self.types)
+                self.types.append(node['type'])
+        self.parent.extend(parent for parent, _, _ in rows)
+        self.x0.extend(c[0][0] for _, _, c in rows)
+        self.y0.extend(c[0][1] for _, _, c in rows)
+        self.x1.extend(c[1][0] for _, _, c in rows)
+        self.y1.extend(c[1][1] for _, _, c in rows)
+        self.type_id.extend(type_ids[node['type']] for _, node, _ in rows)
+        self.names.extend(node['name'] for _, node, _ in rows)
+
+    def coords(self, i):
+        return ((self.x0[i], self.y0[i]), (self.x1[i], self.y1[i]))
+
+    def type(self, i):
+        return self.types[self.type_id[i]]
+
+    def children(self):
+        children = [[] for _ in range(len(self) + 1)]
+        for i, p in enumerate(self.parent):
+            children[p].append(i)
+        # top level boxes are the children of the sentinel at index -1
+        return children
+
+    def pre_order(self):
+        """(box index, depth) parents first, the order boxes are painted in"""
+        children = self.children()
+        stack = [(i, 0) for i in reversed(children[-1])]
+        while stack:
+            i, depth = stack.pop()
+            yield i, depth
+            stack.extend((c, depth+1) for c in reversed(children[i]))
+
+    def to_text(self):
+        lines = []
+        for i, depth in self.pre_order():
+            ((x0, y0), (x1, y1)) = self.coords(i)
+            lines.append(f"{'  '*depth}{self.names[i]} ({self.type(i)}) "
+                         f"[{x0},{y0} {x1},{y1}]")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def flip_xy_coord(c):
+        return ((c[0][1], c[0][0]), (c[1][1], c[1][0]))
+
+    def get_sibling_coords(self, parent_coords, tree, no_margin=False):
+        coords = [((0, 0), (0, 0))]*len(tree)
+        idx_top = []
+        idx_mini = []
+        idx_middle = []
+        for i, sibling in enumerate(tree):
+            type_position = self.type_position.get(sibling['type'], 'mini')
+            if type_position == "top":
+                idx_top.append(i)
+            elif type_position == "mini":
+                idx_mini.append(i)
+            elif type_position == "middle":
+                idx_middle.append(i)
+        if idx_top:
+            div3_coords = self.divide_rectangle(
+                parent_coords, 3, no_margin, y_div=True)
+            top_parent_coords = div3_coords[0]
+            parent_coords = (div3_coords[1][0], div3_coords[2][1])
+            top_coords = self.divide_rectangle(
+                top_parent_coords, len(idx_top), no_margin)
+            for i, c in zip(idx_top, top_coords):
+                coords[i] = c
+        if idx_mini:
+            ((x0, y0), (x1, y1)) = parent_coords
+            mini_parent_coords = ((x0, y0+self.margin), (x1, y0+self.margin+30*len(idx_mini)))
+            parent_coords = ((x0, y0+30*len(idx_mini)), (x1, y1))
+            mini_coords = self.divide_rectangle(
+                mini_parent_coords, len(idx_mini), no_margin)
+            for i, c in zip(idx_mini, mini_coords):
+                coords[i] = c
+        if idx_middle:
+            middle_coords = self.divide_rectangle(
+                parent_coords, len(idx_middle), no_margin)
+            for i, c in zip(idx_middle, middle_coords):
+                coords[i] = c
+        return coords
+
+    def divide_rectangle(self, coords, nb, no_margin=False, y_div=False):
+        if y_div:
+            coords = self.flip_xy_coord(coords)
+        margin = self.margin if not no_margin else 0
+        ((x0, y0), (x1, y1)) = coords
+        dx = ((x1-x0-margin) // nb)
+        X0 = x0 + margin
+        Y0 = y0 + margin
+        Y1 = y1 - margin
+        new_coords = [((X0+dx*i, Y0), (X0+dx*(i+1)-margin, Y1))
+                      for i in range(nb)]
+        if y_div:
+            new_coords = [self.flip_xy_coord(c) for c in new_coords]
+        return new_coords
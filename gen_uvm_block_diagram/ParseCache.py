@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class ParseCache:
+    """On-disk cache of parse_classes() results, keyed by file content
+
+    Entries are small json files named after sha256(backend, version,
+    content). Writes go through a temporary file and os.replace() so that
+    parallel jobs sharing the directory never see partial entries. Hits
+    refresh the entry mtime, eviction removes least recently used entries
+    once the directory grows past max_size bytes.
+    """
+
+    def __init__(self, directory, max_size=256*1024*1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(filepath, backend, version, exclude=()):
+        h = hashlib.sha256()
+        h.update(f"{backend}\0{version}\0{','.join(exclude)}\0".encode("utf8"))
+        with open(filepath, 'rb') as f:
+            h.update(f.read())
+        return h.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        """Return cached classes for key, None on miss"""
+        path = self.entry_path(key)
+        try:
+            with open(path, 'r') as f:
+                classes = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            # missing, evicted by another job or truncated
+            self.misses += 1
+            return None
+        self.hits += 1
+        for cl in classes:
+            cl['properties'] = [tuple(p) for p in cl['properties']]
+        return classes
+
+    def put(self, key, classes):
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(classes or [], f)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self.stores += 1
+        if self._size is None:
+            self._size = self.disk_usage()
+        else:
+            self._size += os.path.getsize(path)
+        if self._size > self.max_size:
+            self.evict()
+
+    def entries(self):
+        for d in os.scandir(self.directory):
+            if not d.is_dir():
+                continue
+            for e in os.scandir(d.path):
+                if e.name.endswith(".json"):
+                    try:
+                        yield e.path, e.stat()
+                    except OSError:
+                        pass
+
+    def disk_usage(self):
+        return sum(st.st_size for _, st in self.entries())
+
+    def evict(self, target_ratio=0.8):
+        """Remove least recently used entries until under target_ratio*max_size"""
+        with open(os.path.join(self.directory, ".lock"), 'w') as lock:
+            if fcntl:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # another job is already evicting
+                    return
+            entries = sorted(self.entries(), key=lambda e: e[1].st_mtime)
+            size = sum(st.st_size for _, st in entries)
+            for path, st in entries:
+                if size <= self.max_size * target_ratio:
+                    break
+                try:
+                    os.remove(path)
+                    self.evictions += 1
+                except OSError:
+                    pass
+                size -= st.st_size
+            self._size = size
+
+    def report(self):
+        total = self.hits + self.misses
+        ratio = 100 * self.hits / total if total else 0
+        return (f"parse cache: {self.hits} hits, {self.misses} misses "
+                f"({ratio:.1f}% hit rate), {self.stores} stores, "
+                f"{self.evictions} evictions")
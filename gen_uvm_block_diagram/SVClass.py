@@ -1,46 +1,238 @@
-from .parsers.verible import SVFileParser
+import os
+
+from .Trace import Trace
+from .parsers import backends, get_backend
 
 
 class SVClass:
     """Represents systemverilog classes, the way to relate to each other"""
 
     classes = {}
+    files = {}
     exclude = ["uvm_sequence", "uvm_sequence_item", "uvm_object"]
+    # parser backend name, its SVFileParser is imported by get_parser()
+    backend = os.environ.get("GEN_UVM_BACKEND", "verible")
+    parser = None
+    # shared hierarchy nodes of classes that are not part of a cycle, keyed
+    # by class name
+    _nodes = {}
 
-    def __init__(self, name, type, properties):
+    def __init__(self, name, type, properties, file=None):
         self.name = self.remove_param_from_string(name)
         self.type = self.remove_param_from_string(type)
         self.full_name = name
         self.full_type = type
         self.properties = properties
+        self.file = file
+        # top-level files including self.file, see set_origins()
+        self.origin = [file] if file else []
+
+    @classmethod
+    def use_backend(cls, backend):
+        """Select the parser backend by name, it is imported on first use"""
+        if backend not in backends:
+            raise ValueError(f"unknown backend {backend}, expected one of {', '.join(backends)}")
+        cls.backend = backend
+        cls.parser = None
+
+    @classmethod
+    def get_parser(cls):
+        if cls.parser is None:
+            cls.parser = get_backend(cls.backend)
+        return cls.parser
 
     @staticmethod
     def remove_param_from_string(s):
         return s.split()[0].split('#')[0] if s else ''
 
-    def get_tree(self, level=0):
-        prop_trees = []
+    def get_tree(self):
+        """Return the class hierarchy as a list of node dicts
+
+        Nodes of the same class are shared, the result is a DAG and must
+        not be modified, see expand_tree() for an independent copy. A
+        property whose class is already on the current path is a cycle and
+        is kept as a leaf.
+        """
+        with Trace.span("get_tree"):
+            node, _ = self.get_node({})
+        return [node] if node else []
+
+    def get_node(self, path):
+        """Return (node, low) for this class reached through path
+
+        path maps the classes being expanded to their depth, low is the
+        smallest depth of path reached by a cycle below this class. Only
+        nodes outside any cycle (low > depth) are memoized, their subtree
+        does not depend on the path.
+        """
+        if self.full_name in self._nodes:
+            return self._nodes[self.full_name], len(path) + 1
         if self.name in self.exclude or self.type in self.exclude:
-            return []
+            return None, len(path) + 1
+        depth = len(path)
+        path[self.full_name] = depth
+        low = depth + 1
+        prop_trees = []
         for p in self.properties:
             class_name = p[0]
-            if class_name in self.classes and level < 10:
-                prop_trees += self.classes[class_name].get_tree(
-                    level + 1)
+            if class_name in self.classes and class_name not in path:
+                node, node_low = self.classes[class_name].get_node(path)
+                low = min(low, node_low)
+                if node:
+                    prop_trees.append(node)
             else:
-                prop_trees += [{'name': class_name, 'type': class_name, 'properties': []}]
-        return [{'name': self.name, 'type': self.type, 'properties': prop_trees}]
+                if class_name in path:
+                    low = min(low, path[class_name])
+                prop_trees.append({'name': class_name, 'type': class_name, 'properties': []})
+        del path[self.full_name]
+        node = {'name': self.name, 'type': self.type, 'properties': prop_trees}
+        if low > depth:
+            self._nodes[self.full_name] = node
+        return node, low
+
+    @staticmethod
+    def expand_tree(tree):
+        """Independent copy of a get_tree() result, with no shared nodes"""
+        return [{'name': n['name'], 'type': n['type'],
+                 'properties': SVClass.expand_tree(n['properties'])} for n in tree]
+
+    @staticmethod
+    def tree_lines(tree, level=0):
+        """Lines of print_tree(), one "type name" per node indented by depth"""
+        for sibling in tree:
+            yield f"{level*'  '}{sibling['type']} {sibling['name']}"
+            yield from SVClass.tree_lines(sibling['properties'], level+1)
 
     def print_tree(self, tree=[], level=0):
         if level == 0:
             tree = self.get_tree()
-        for sibling in tree:
-            print(f"{level*'  '}{sibling['type']} {sibling['name']}")
-            self.print_tree(sibling['properties'], level+1)
+        for line in self.tree_lines(tree, level):
+            print(line)
 
     @classmethod
-    def parse_file(cls, file):
-        p = SVFileParser(file, cls.exclude)
-        for cl in p.parse_classes():
+    def add_classes(cls, class_infos, file=None):
+        names = []
+        for cl in class_infos or []:
             cls.classes[cl['name']] = SVClass(
-                cl['name'], cl['type'], cl['properties'])
+                cl['name'], cl['type'], cl['properties'], file)
+            names.append(cl['name'])
+        if file is not None:
+            cls.files[file] = names
+        cls._nodes.clear()
+
+    @classmethod
+    def set_origins(cls, discovery):
+        """Tag classes with the top-level files including them"""
+        for c in cls.classes.values():
+            if c.file:
+                c.origin = discovery.origins(c.file)
+
+    @classmethod
+    def invalidate(cls, names):
+        """Drop shared nodes of names and of every class reaching them
+
+        Returns the set of invalidated class names.
+        """
+        referrers = {}
+        for name, c in cls.classes.items():
+            for p in c.properties:
+                referrers.setdefault(p[0], set()).add(name)
+        stale = set()
+        todo = list(names)
+        while todo:
+            name = todo.pop()
+            if name not in stale:
+                stale.add(name)
+                todo.extend(referrers.get(name, ()))
+        cls._nodes = {k: v for k, v in cls._nodes.items() if k not in stale}
+        return stale
+
+    @classmethod
+    def parse_file(cls, file):
+        p = cls.get_parser()(file, cls.exclude)
+        cls.add_classes(p.parse_classes(), file)
+
+    @classmethod
+    def parse_files(cls, files, jobs=1, cache=None):
+        """Parse many files at once, same result as parse_file on each file
+
+        Files whose content is found in cache (a ParseCache) are not parsed.
+        """
+        results = cls._parse_results(files, jobs, cache)
+        for file, class_infos in results.items():
+            cls.add_classes(class_infos, file)
+
+    @classmethod
+    def parse_reachable(cls, root, index, jobs=1, cache=None):
+        """Parse only the files needed to build the tree of root
+
+        index is a SymbolIndex giving the file of each class. Files are
+        parsed level by level, following the property types get_tree()
+        looks up.
+        """
+        seen = {root}
+        names = [root]
+        while names:
+            files = [index.files[n] for n in names
+                     if n in index.files and index.files[n] not in cls.files]
+            for file, class_infos in cls._parse_results(files, jobs, cache).items():
+                cls.add_classes(class_infos, file)
+            next_names = []
+            for name in names:
+                c = cls.classes.get(name)
+                if not c or c.name in cls.exclude or c.type in cls.exclude:
+                    continue
+                for p in c.properties:
+                    if p[0] not in seen:
+                        seen.add(p[0])
+                        next_names.append(p[0])
+            names = next_names
+
+    @classmethod
+    def update_files(cls, changed, removed=(), jobs=1, cache=None):
+        """Re-parse changed files, forget removed ones
+
+        Only the classes declared in those files are replaced, and only the
+        cached trees reaching them are dropped. Returns the set of class
+        names whose tree changed.
+        """
+        results = cls._parse_results(changed, jobs, cache)
+        names = set()
+        for file in list(removed) + list(results):
+            for name in cls.files.pop(file, []):
+                if name in cls.classes and cls.classes[name].file == file:
+                    del cls.classes[name]
+                    names.add(name)
+        for file, class_infos in results.items():
+            for cl in class_infos or []:
+                cls.classes[cl['name']] = SVClass(
+                    cl['name'], cl['type'], cl['properties'], file)
+                names.add(cl['name'])
+            cls.files[file] = [cl['name'] for cl in class_infos or []]
+        return cls.invalidate(names)
+
+    @classmethod
+    def _parse_results(cls, files, jobs=1, cache=None):
+        """Return {file: class_infos} in files order"""
+        files = list(dict.fromkeys(files))
+        results = {}
+        keys = {}
+        parser = cls.get_parser()
+        if cache:
+            version = parser.version()
+            for file in files:
+                keys[file] = cache.key(file, parser.backend, version, cls.exclude)
+                class_infos = cache.get(keys[file])
+                if class_infos is not None:
+                    results[file] = class_infos
+        todo = [f for f in files if f not in results]
+        Trace.count("cache hits", len(results))
+        Trace.count("cache misses", len(todo) if cache else 0)
+        with Trace.span("parse", backend=parser.backend, files=len(todo)):
+            parsed = parser.parse_files(todo, cls.exclude, jobs)
+        for file, class_infos in parsed.items():
+            results[file] = class_infos
+            Trace.count("classes extracted", len(class_infos or []))
+            if cache:
+                cache.put(keys[file], class_infos)
+        return {file: results[file] for file in files if file in results}
@@ -0,0 +1,136 @@
+import os
+import re
+import shlex
+
+
+class SourceDiscovery:
+    """Find the physical files to parse from sources, filelists and includes
+
+    `include directives are followed to build the include graph, every
+    physical file is listed once whatever the number of paths leading to
+    it, so that it is parsed exactly once.
+    """
+
+    include_re = re.compile(rb'^[ \t]*`include[ \t]+["<]([^">]+)[">]', re.M)
+    # arguments of unknown filelist options with these extensions are
+    # sources, -sv tb.sv, other ones are the option value, -l run.log
+    source_exts = ('.sv', '.svh', '.svi', '.svp', '.v', '.vh', '.vp')
+
+    def __init__(self, incdirs=()):
+        self.incdirs = list(incdirs)
+        # realpath -> path used to parse the file, in discovery order
+        self.files = {}
+        # realpath -> realpaths of the files it includes
+        self.includes = {}
+        # realpath -> realpaths of the files including it
+        self.included_by = {}
+        # (referrer, name, "include", "source" or "filelist") not found:
+        # `include names of a file, sources and filelists of a filelist or
+        # of the command line (referrer None)
+        self.missing = []
+        # filelists read, nested ones included
+        self.filelists = []
+
+    def sources(self):
+        return list(self.files.values())
+
+    def add_filelist(self, filelist, relative_to_filelist=False, referrer=None):
+        """Read a .f filelist: sources, +incdir+, -f/-F nested filelists
+
+        Other options are skipped with their argument, if any.
+        """
+        base = os.path.dirname(filelist) if relative_to_filelist else ''
+        self.filelists.append(filelist)
+        try:
+            with open(filelist, 'r') as f:
+                text = re.sub(r'(//|#).*', '', f.read())
+        except OSError:
+            self.missing.append((referrer, filelist, "filelist"))
+            return
+        args = list(shlex.split(os.path.expandvars(text)))
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            i += 1
+            if arg.startswith('+incdir+'):
+                self.incdirs += [os.path.join(base, d) for d in arg.split('+')[2:] if d]
+            elif arg in ('-f', '-F'):
+                if i < len(args):
+                    nested = os.path.join(base, args[i])
+                    self.add_filelist(nested, arg == '-F', filelist)
+                i += 1
+            elif arg in ('-v', '-y'):
+                # library files and directories are not sources
+                i += 1
+            elif arg.startswith('-'):
+                if i < len(args) and not self.is_source_arg(args[i]):
+                    i += 1
+            elif arg.startswith('+'):
+                continue
+            else:
+                self.add(os.path.join(base, arg), filelist)
+
+    @classmethod
+    def is_source_arg(cls, arg):
+        """Whether the argument following an unknown option is not its value"""
+        return arg.startswith(('-', '+')) or arg.lower().endswith(cls.source_exts)
+
+    def add(self, path, referrer=None):
+        """Add a source file and, recursively, the files it includes
+
+        A missing path is recorded in missing, referrer being the filelist
+        listing it.
+        """
+        if not os.path.isfile(path):
+            self.missing.append((referrer, path, "source"))
+            return
+        todo = [path]
+        while todo:
+            path = todo.pop()
+            real = os.path.realpath(path)
+            if real in self.files:
+                continue
+            self.files[real] = path
+            self.includes[real] = []
+            try:
+                with open(path, 'rb') as f:
+                    names = self.include_re.findall(f.read())
+            except OSError:
+                continue
+            found = []
+            for name in names:
+                name = name.decode('utf8')
+                included = self.resolve(name, os.path.dirname(path))
+                if not included:
+                    self.missing.append((path, name, "include"))
+                    continue
+                included_real = os.path.realpath(included)
+                self.includes[real].append(included_real)
+                self.included_by.setdefault(included_real, []).append(real)
+                found.append(included)
+            # visit included files in directive order
+            todo.extend(reversed(found))
+
+    def resolve(self, name, includer_dir):
+        for d in [includer_dir] + self.incdirs + ['']:
+            path = os.path.join(d, name)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def origins(self, path):
+        """Paths of the files not included by any other file reaching path"""
+        real = os.path.realpath(path)
+        seen = {real}
+        todo = [real]
+        roots = []
+        while todo:
+            f = todo.pop()
+            includers = self.included_by.get(f, [])
+            if not includers:
+                roots.append(self.files.get(f, f))
+            for i in includers:
+                if i not in seen:
+                    seen.add(i)
+                    todo.append(i)
+        return sorted(roots)
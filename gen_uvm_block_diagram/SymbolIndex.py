@@ -0,0 +1,27 @@
+import re
+
+
+class SymbolIndex:
+    """Map class names to the file declaring them, from a lexical pre-scan
+
+    Much cheaper than parsing: comments are stripped and class headers are
+    matched with a regex. When a class is declared in several files the
+    last one wins, like in the SVClass registry.
+    """
+
+    comment_re = re.compile(rb'//[^\n]*|/\*.*?\*/', re.S)
+    class_re = re.compile(
+        rb'(\btypedef\s+)?\bclass\s+(?:static\s+|automatic\s+)?([A-Za-z_][\w$]*|\\\S+)')
+
+    def __init__(self, files=()):
+        self.files = {}
+        for file in files:
+            self.scan(file)
+
+    def scan(self, file):
+        with open(file, 'rb') as f:
+            src = self.comment_re.sub(b'', f.read())
+        for typedef, name in self.class_re.findall(src):
+            # forward declarations do not declare the class body
+            if not typedef:
+                self.files[name.decode('utf8')] = file
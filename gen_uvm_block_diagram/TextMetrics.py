@@ -0,0 +1,107 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class TextMetrics:
+    """Fonts and label measurements shared by every diagram of the process
+
+    Fonts are loaded once per (path, size), text extents are measured once
+    per (path, size, text) and labels are fitted once per box size, so
+    repeated component names cost a dict lookup. Extents and fits are kept
+    in LRU caches of cache_size entries, they would otherwise grow with
+    every box size of a long running process.
+    """
+
+    font_path = os.environ.get(
+        "GEN_UVM_FONT", "/home/antoine/.fonts/DejaVuSansMono/DejaVu Sans Mono Nerd Font Complete.ttf")
+    ellipsis = "..."
+    fonts = {}
+    extents = OrderedDict()
+    fits = OrderedDict()
+    cache_size = 4096
+    _lock = threading.Lock()
+
+    @classmethod
+    def font(cls, size, path=None):
+        """Font at size, PIL builtin font when path cannot be loaded"""
+        key = (path or cls.font_path, size)
+        font = cls.fonts.get(key)
+        if font is None:
+            from PIL import ImageFont
+            try:
+                font = ImageFont.truetype(key[0], size)
+            except OSError:
+                try:
+                    font = ImageFont.load_default(size)
+                except TypeError:
+                    # Pillow < 10.1, fixed size bitmap font
+                    font = ImageFont.load_default()
+            cls.fonts[key] = font
+        return font
+
+    @classmethod
+    def cached(cls, cache, key):
+        with cls._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+        return value
+
+    @classmethod
+    def store(cls, cache, key, value):
+        with cls._lock:
+            cache[key] = value
+            if len(cache) > cls.cache_size:
+                cache.popitem(last=False)
+        return value
+
+    @classmethod
+    def extent(cls, text, size, path=None):
+        """(width, bottom) of text, bottom counted from the top of the line"""
+        key = (path or cls.font_path, size, text)
+        extent = cls.cached(cls.extents, key)
+        if extent is None:
+            font = cls.font(size, path)
+            extent = cls.store(cls.extents, key, (font.getlength(text), font.getbbox(text)[3]))
+        return extent
+
+    @classmethod
+    def length(cls, text, size, path=None):
+        return cls.extent(text, size, path)[0]
+
+    @classmethod
+    def fit(cls, text, width, size, min_size=None, path=None, height=None):
+        """Return (size, label) to draw text in a width x height box
+
+        The font is shrunk down to min_size, then the text is truncated
+        with an ellipsis. label is empty when not even that fits, or when
+        it is taller than height at min_size.
+        """
+        path = path or cls.font_path
+        min_size = min(min_size or size, size)
+        key = (path, text, width, height, size, min_size)
+        fitted = cls.cached(cls.fits, key)
+        if fitted is not None:
+            return fitted
+        for s in range(size, min_size-1, -1):
+            w, bottom = cls.extent(text, s, path)
+            if w <= width and (height is None or bottom <= height):
+                fitted = (s, text)
+                break
+        else:
+            # longest prefix that fits with the ellipsis
+            label = ""
+            lo, hi = 1, len(text) - 1
+            while lo <= hi:
+                mid = (lo + hi) // 2
+                candidate = text[:mid] + cls.ellipsis
+                if cls.length(candidate, min_size, path) <= width:
+                    label = candidate
+                    lo = mid + 1
+                else:
+                    hi = mid - 1
+            if label and height is not None and cls.extent(label, min_size, path)[1] > height:
+                label = ""
+            fitted = (min_size, label)
+        return cls.store(cls.fits, key, fitted)
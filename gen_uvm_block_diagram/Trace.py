@@ -0,0 +1,130 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+
+class Span:
+    """Time a stage, see Trace.span()"""
+
+    __slots__ = ("name", "args", "wall", "cpu")
+
+    def __init__(self, name, args, cpu=True):
+        self.name = name
+        self.args = args
+        self.cpu = cpu
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time() if self.cpu else None
+        return self
+
+    def __exit__(self, *exc):
+        cpu = time.thread_time() - self.cpu if self.cpu is not None else 0.0
+        Trace.record(self.name, self.wall, time.perf_counter() - self.wall, cpu, self.args)
+        return False
+
+
+class Trace:
+    """Per-stage wall/cpu times and counters of a run, disabled by default
+
+    Instrumented code calls Trace.span(name) and Trace.count(name, n).
+    When disabled both return right away, span() handing out a shared
+    no-op context manager. When enabled, spans are kept as chrome trace
+    events and summed per stage name. Worker processes send their events
+    back with drain() and merge().
+    """
+
+    enabled = False
+    events = []
+    stages = {}
+    counters = {}
+    _lock = threading.Lock()
+    _null = contextlib.nullcontext()
+
+    @classmethod
+    def enable(cls, enabled=True):
+        cls.enabled = enabled
+
+    @classmethod
+    def reset(cls):
+        cls.events = []
+        cls.stages = {}
+        cls.counters = {}
+
+    @classmethod
+    def init_worker(cls, enabled):
+        # forked workers inherit what the parent recorded so far
+        cls.reset()
+        cls.enable(enabled)
+
+    @classmethod
+    def span(cls, name, cpu=True, **args):
+        """Context manager timing a stage
+
+        Spans around an await get cpu=False: other tasks run on the thread
+        meanwhile, only the wall time belongs to the stage.
+        """
+        if not cls.enabled:
+            return cls._null
+        return Span(name, args, cpu)
+
+    @classmethod
+    def count(cls, name, n=1):
+        if cls.enabled:
+            with cls._lock:
+                cls.counters[name] = cls.counters.get(name, 0) + n
+
+    @classmethod
+    def record(cls, name, start, wall, cpu, args=None):
+        event = {"name": name, "ph": "X", "ts": start * 1e6, "dur": wall * 1e6,
+                 "pid": os.getpid(), "tid": threading.get_ident()}
+        if args:
+            event["args"] = args
+        with cls._lock:
+            cls.events.append(event)
+            stage = cls.stages.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0})
+            stage["calls"] += 1
+            stage["wall"] += wall
+            stage["cpu"] += cpu
+
+    @classmethod
+    def drain(cls):
+        """Return and forget what was recorded, None when disabled"""
+        if not cls.enabled:
+            return None
+        with cls._lock:
+            data = (cls.events, cls.stages, cls.counters)
+            cls.reset()
+        return data
+
+    @classmethod
+    def merge(cls, data):
+        """Add what drain() returned in another process"""
+        if not data:
+            return
+        events, stages, counters = data
+        with cls._lock:
+            cls.events.extend(events)
+            for name, s in stages.items():
+                stage = cls.stages.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0})
+                for k in stage:
+                    stage[k] += s[k]
+            for name, n in counters.items():
+                cls.counters[name] = cls.counters.get(name, 0) + n
+
+    @classmethod
+    def metrics(cls):
+        return {"stages": cls.stages, "counters": cls.counters}
+
+    @classmethod
+    def write_metrics(cls, path):
+        with open(path, 'w') as f:
+            json.dump(cls.metrics(), f, indent=2)
+
+    @classmethod
+    def write_chrome_trace(cls, path):
+        """Trace Event Format file, open it in chrome://tracing or Perfetto"""
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": cls.events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,69 @@
+import glob
+import os
+import time
+
+
+class Watcher:
+    """Poll a set of source files and report the ones that changed
+
+    patterns are paths or glob patterns. With discover, a callable
+    returning a SourceDiscovery, the files reported are the discovered
+    sources; the pattern matches, the filelists read and the sources are
+    all polled, and discover runs again when one of them changes or the
+    patterns match new files, so new filelist entries and `includes are
+    picked up.
+    """
+
+    def __init__(self, patterns, interval=0.2, discover=None):
+        self.patterns = patterns
+        self.interval = interval
+        self.discover = discover
+        self.discovery = discover() if discover else None
+        self.stats = self.snapshot()
+
+    def sources(self):
+        files = []
+        for pattern in self.patterns:
+            files += glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        return list(dict.fromkeys(files))
+
+    def files(self, stats):
+        """Files reported by poll() among the polled ones"""
+        if self.discovery is None:
+            return list(stats)
+        return self.discovery.sources()
+
+    def snapshot(self):
+        files = self.sources()
+        if self.discovery is not None:
+            files = list(dict.fromkeys(files + self.discovery.filelists + self.discovery.sources()))
+        stats = {}
+        for file in files:
+            try:
+                st = os.stat(file)
+            except OSError:
+                continue
+            stats[file] = (st.st_mtime_ns, st.st_size)
+        return stats
+
+    def poll(self):
+        """Return (changed, removed) files since the previous poll"""
+        previous = self.files(self.stats)
+        stats = self.snapshot()
+        if self.discover is not None and stats != self.stats:
+            self.discovery = self.discover()
+            stats = self.snapshot()
+        files = self.files(stats)
+        changed = [f for f in files if f in stats and self.stats.get(f) != stats[f]]
+        current = set(files)
+        removed = [f for f in previous if f not in stats or f not in current]
+        self.stats = stats
+        return changed, removed
+
+    def run(self, callback):
+        """Call callback(changed, removed) on every change, forever"""
+        while True:
+            time.sleep(self.interval)
+            changed, removed = self.poll()
+            if changed or removed:
+                callback(changed, removed)
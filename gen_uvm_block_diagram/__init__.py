@@ -1,2 +1,13 @@
+# PIL and http.server are only imported when something is drawn or served
+from .Canvas import PDFCanvas, RasterCanvas, SVGCanvas
 from .DrawClass import DrawClass
+from .Layout import Layout
 from .SVClass import SVClass
+from .TextMetrics import TextMetrics
+from .ParseCache import ParseCache
+from .Watcher import Watcher
+from .SourceDiscovery import SourceDiscovery
+from .SymbolIndex import SymbolIndex
+from .BatchRender import BatchRender
+from .Trace import Trace
+from .Daemon import Daemon
@@ -0,0 +1,34 @@
+import importlib
+import os
+
+# backend name -> module defining its SVFileParser, imported on first use
+backends = {
+    "verible": ".verible",
+    "tree_sitter": ".tree_sitter",
+    "lite": ".lite",
+}
+_loaded = {}
+
+
+def get_backend(name):
+    """SVFileParser class of a backend, importing its module the first time"""
+    parser = _loaded.get(name)
+    if parser is None:
+        if name not in backends:
+            raise ValueError(f"unknown backend {name}, expected one of {', '.join(backends)}")
+        parser = _loaded[name] = importlib.import_module(backends[name], __name__).SVFileParser
+    return parser
+
+
+def split_chunks(paths, nb):
+    """Split paths in at most nb chunks of similar total file size"""
+    nb = max(1, min(nb, len(paths)))
+    sizes = {p: os.path.getsize(p) if os.path.exists(p) else 0 for p in paths}
+    chunks = [[] for _ in range(nb)]
+    chunk_sizes = [0] * nb
+    # biggest files first, each one into the lightest chunk
+    for p in sorted(paths, key=lambda p: sizes[p], reverse=True):
+        i = chunk_sizes.index(min(chunk_sizes))
+        chunks[i].append(p)
+        chunk_sizes[i] += sizes[p]
+    return [c for c in chunks if c]
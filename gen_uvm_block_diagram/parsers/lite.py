@@ -0,0 +1,485 @@
+import re
+
+from ..Trace import Trace
+from . import get_backend
+
+KEYWORDS = frozenset("""
+    alias always always_comb always_ff always_latch and assert assign assume
+    automatic before begin bind bins binsof bit break buf bufif0 bufif1 byte
+    case casex casez cell chandle checker class clocking cmos config const
+    constraint context continue cover covergroup coverpoint cross deassign
+    default defparam design disable dist do edge else end endcase endchecker
+    endclass endclocking endconfig endfunction endgenerate endgroup
+    endinterface endmodule endpackage endprimitive endprogram endproperty
+    endspecify endsequence endtable endtask enum event eventually expect
+    export extends extern final first_match for force foreach forever fork
+    forkjoin function generate genvar global highz0 highz1 if iff ifnone
+    ignore_bins illegal_bins implements implies import incdir include initial
+    inout input inside instance int integer interconnect interface intersect
+    join join_any join_none large let liblist library local localparam logic
+    longint macromodule matches medium modport module nand negedge nettype new
+    nexttime nmos nor noshowcancelled not notif0 notif1 null or output package
+    packed parameter pmos posedge primitive priority program property
+    protected pull0 pull1 pulldown pullup pulsestyle_ondetect
+    pulsestyle_onevent pure rand randc randcase randsequence rcmos real
+    realtime ref reg reject_on release repeat restrict return rnmos rpmos
+    rtran rtranif0 rtranif1 s_always s_eventually s_nexttime s_until
+    s_until_with scalared sequence shortint shortreal showcancelled signed
+    small soft solve specify specparam static string strong strong0 strong1
+    struct super sync_accept_on sync_reject_on table tagged task this
+    throughout time timeprecision timeunit tran tranif0 tranif1 tri tri0 tri1
+    triand trior trireg type typedef union unique unique0 unsigned until
+    until_with untyped use uwire var vectored virtual void wait wait_order wand
+    weak weak0 weak1 while wildcard wire with within wor xnor xor
+""".split())
+
+# types that are keywords: declarations using them have no class property
+BUILTIN_TYPES = frozenset("""
+    bit byte chandle event int integer logic longint real realtime reg
+    shortint shortreal string time
+""".split())
+
+QUALIFIERS = frozenset("""
+    automatic const local protected rand randc static var
+""".split())
+
+TOKEN_RE = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:\\.|[^"\\])*")
+  | (?P<directive>`[A-Za-z_]\w*)
+  | (?P<escaped>\\\S+)
+  | (?P<id>[A-Za-z_][\w$]*)
+  | (?P<number>\d[\w.']*|'[sS]?[bBoOdDhH]?\w*)
+  | (?P<op>::|\S)
+''', re.S | re.X)
+
+MACRO_END_RE = re.compile(r'(?<!\\)\n')
+
+CONDITIONAL_DIRECTIVES = frozenset(
+    ["`ifdef", "`ifndef", "`elsif", "`else", "`endif", "`undef"])
+
+DESIGN_ELEMENTS = {
+    "package": "endpackage",
+    "module": "endmodule",
+    "macromodule": "endmodule",
+    "interface": "endinterface",
+    "program": "endprogram",
+    "checker": "endchecker",
+}
+
+
+class Unsupported(Exception):
+    """Construct the lite parser does not handle with confidence"""
+
+
+class LiteParser:
+    """Token-level parser for class headers and class-scope declarations"""
+
+    def __init__(self, src):
+        self.src = src
+        self.tokens = self.tokenize(src)
+        self.i = 0
+
+    @staticmethod
+    def tokenize(src):
+        tokens = []
+        skip_until = -1
+        for m in TOKEN_RE.finditer(src):
+            kind = m.lastgroup
+            if kind in ("space", "comment") or m.start() < skip_until:
+                continue
+            if kind == "directive" and m.group() == "`define":
+                # macro bodies end at the first newline not escaped
+                end = MACRO_END_RE.search(src, m.end())
+                skip_until = end.end() if end else len(src)
+                continue
+            if kind == "escaped":
+                kind = "id"
+            elif kind == "id" and m.group() in KEYWORDS:
+                kind = "keyword"
+            tokens.append((kind, m.group()))
+        return tokens
+
+    def peek(self, offset=0):
+        i = self.i + offset
+        return self.tokens[i] if i < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            raise Unsupported("unexpected end of file")
+        self.i += 1
+        return token
+
+    def expect_text(self, text):
+        _, t = self.next()
+        if t != text:
+            raise Unsupported(f"expected '{text}', found '{t}'")
+
+    def skip_balanced(self, open_="(", close=")"):
+        """Skip a balanced group starting at the current open_ token"""
+        self.expect_text(open_)
+        depth = 1
+        while depth:
+            _, t = self.next()
+            if t == open_:
+                depth += 1
+            elif t == close:
+                depth -= 1
+
+    def skip_statement(self):
+        """Skip up to and including the next ';' outside parentheses"""
+        while True:
+            t = self.peek()[1]
+            if t in ("(", "{", "["):
+                self.skip_balanced(t, {"(": ")", "{": "}", "[": "]"}[t])
+            elif self.next()[1] == ";":
+                return
+
+    def parse(self):
+        """Return class records, ordered like verible's level-order search"""
+        classes = []
+        # design element end keywords still open
+        scopes = []
+        position = 0
+        while self.peek()[0] is not None:
+            kind, t = self.peek()
+            if kind == "directive":
+                self.next()
+                if self.peek()[1] == "(":
+                    self.skip_balanced()
+            elif t in DESIGN_ELEMENTS and not (t == "interface" and self.peek(1)[1] == "class"):
+                self.next()
+                scopes.append(DESIGN_ELEMENTS[t])
+            elif scopes and t == scopes[-1]:
+                self.next()
+                scopes.pop()
+            elif t == "typedef":
+                self.skip_statement()
+            elif t == "class" or (t == "virtual" and self.peek(1)[1] == "class"):
+                if scopes and scopes != ["endpackage"]:
+                    raise Unsupported("class inside a design element")
+                class_info = self.parse_class()
+                classes.append((len(scopes), position, class_info))
+                position += 1
+            elif t == "interface":
+                raise Unsupported("interface class")
+            else:
+                self.next()
+        # verible visits top-level classes before the ones of packages
+        return [c for _, _, c in sorted(classes, key=lambda c: c[:2])]
+
+    def parse_class(self):
+        if self.peek()[1] == "virtual":
+            self.next()
+        self.expect_text("class")
+        if self.peek()[1] in ("static", "automatic"):
+            self.next()
+        kind, name = self.next()
+        if kind != "id":
+            raise Unsupported(f"class name '{name}'")
+        class_info = {
+            "name": name,
+            "type": "",
+            "properties": [],
+        }
+        if self.peek()[1] == "#":
+            self.next()
+            self.skip_balanced()
+        if self.peek()[1] == "extends":
+            self.next()
+            kind, base = self.next()
+            if kind != "id" or self.peek()[1] == "::":
+                raise Unsupported(f"base class '{base}'")
+            class_info["type"] = base
+            if self.peek()[1] == "#":
+                self.next()
+                self.skip_balanced()
+            if self.peek()[1] == "(":
+                self.skip_balanced()
+        if self.peek()[1] != ";":
+            raise Unsupported(f"class header of '{name}'")
+        self.next()
+        self.parse_class_items(class_info)
+        return class_info
+
+    def parse_class_items(self, class_info):
+        # declarations of method bodies, verible's level-order search finds
+        # them after the class-scope ones
+        locals_ = []
+        while True:
+            kind, t = self.peek()
+            if t == "endclass":
+                self.next()
+                if self.peek()[1] == ":":
+                    self.next()
+                    self.next()
+                class_info["properties"] += locals_
+                return
+            if kind == "directive":
+                if t in CONDITIONAL_DIRECTIVES:
+                    raise Unsupported(f"{t} in class scope")
+                self.next()
+                if self.peek()[1] == "(":
+                    self.skip_balanced()
+            elif t == ";":
+                self.next()
+            elif t in ("function", "task", "pure", "extern") \
+                    or ((t in QUALIFIERS or t == "virtual") and self.is_method()):
+                self.parse_method(locals_)
+            elif t == "constraint" or (t == "static" and self.peek(1)[1] == "constraint"):
+                while self.peek()[1] != "{":
+                    self.next()
+                self.skip_balanced("{", "}")
+            elif t == "covergroup":
+                while self.next()[1] != "endgroup":
+                    pass
+            elif t in ("parameter", "localparam", "import"):
+                self.skip_statement()
+            elif t in QUALIFIERS or t == "virtual" or kind == "id" or t in BUILTIN_TYPES:
+                self.parse_data_declaration(class_info["properties"])
+            else:
+                raise Unsupported(f"'{t}' in class scope")
+
+    def is_method(self):
+        i = 0
+        while self.peek(i)[1] in QUALIFIERS or self.peek(i)[1] == "virtual":
+            i += 1
+        return self.peek(i)[1] in ("function", "task")
+
+    def parse_method(self, locals_):
+        """Skip a method, adding the declarations of its body to locals_"""
+        prototype = False
+        while True:
+            _, t = self.next()
+            if t in ("pure", "extern"):
+                prototype = True
+            elif t in ("function", "task"):
+                break
+        if prototype:
+            self.skip_statement()
+            return
+        end = "end" + t
+        self.skip_statement()
+        # statement starts in the body, to spot declarations, and begin/fork
+        # blocks nesting
+        statement_start = True
+        depth = 0
+        while True:
+            kind, t = self.next()
+            if t == end:
+                break
+            if kind == "directive" and t in CONDITIONAL_DIRECTIVES:
+                raise Unsupported(f"{t} in method body")
+            if statement_start and (t in QUALIFIERS or t in BUILTIN_TYPES
+                                    or kind == "id" and self.is_declaration()):
+                self.i -= 1
+                properties = []
+                self.parse_data_declaration(properties)
+                if properties and depth:
+                    # deeper in verible's tree than the body declarations
+                    raise Unsupported("declaration of a class type in a nested block")
+                locals_ += properties
+                continue
+            if t in ("begin", "fork"):
+                depth += 1
+            elif t in ("end", "join", "join_any", "join_none"):
+                depth -= 1
+            statement_start = t in (";", "begin", "fork", "else", ")") or kind == "keyword" \
+                and t in ("join", "join_any", "join_none", "end")
+        if self.peek()[1] == ":":
+            self.next()
+            self.next()
+
+    def is_declaration(self):
+        """Whether the identifier just read starts a variable declaration"""
+        offset = 0
+        while True:
+            if self.peek(offset)[1] == "#":
+                if self.peek(offset + 1)[1] != "(":
+                    # delay
+                    return False
+                offset += 1 + self.balanced_length(self.i + offset + 1)
+            elif self.peek(offset)[1] == "::" and self.peek(offset + 1)[0] == "id":
+                # scoped type, or a static method call
+                offset += 2
+            else:
+                return self.peek(offset)[0] == "id"
+
+    def parse_data_declaration(self, properties):
+        """Add the (type, variable) pairs of a declaration to properties"""
+        while self.peek()[1] in QUALIFIERS:
+            self.next()
+        virtual = self.peek()[1] == "virtual"
+        if virtual:
+            # virtual interface, the interface is the type of the property
+            self.next()
+            if self.peek()[1] == "interface":
+                self.next()
+        kind, type_name = self.next()
+        if type_name in BUILTIN_TYPES:
+            # no identifier in the data type, unless in packed dimensions
+            while self.peek()[1] != ";":
+                if self.peek()[1] == "[" and any(
+                        k == "id" for k, _ in self.tokens[self.i:self.i+self.balanced_length()]):
+                    raise Unsupported("identifier in packed dimension")
+                self.next()
+            self.next()
+            return
+        if kind != "id":
+            raise Unsupported(f"data type '{type_name}'")
+        if self.peek()[1] == "#":
+            self.next()
+            self.skip_balanced()
+        if virtual and self.peek()[1] == ".":
+            # modport
+            self.next()
+            if self.next()[0] != "id":
+                raise Unsupported(f"modport of '{type_name}'")
+        if self.peek()[1] in ("::", "["):
+            raise Unsupported(f"data type '{type_name}{self.peek()[1]}'")
+        while True:
+            kind, var = self.next()
+            if kind != "id":
+                raise Unsupported(f"variable name '{var}'")
+            properties.append((type_name, var))
+            # only constant dimensions and initializers without identifiers
+            while self.peek()[1] not in (",", ";"):
+                if self.peek()[1] in ("(", "[", "{"):
+                    open_ = self.peek()[1]
+                    close = {"(": ")", "[": "]", "{": "}"}[open_]
+                    length = self.balanced_length()
+                    if any(k == "id" for k, _ in self.tokens[self.i:self.i+length]):
+                        raise Unsupported(f"expression in declaration of '{var}'")
+                    self.skip_balanced(open_, close)
+                elif self.next()[0] == "id":
+                    raise Unsupported(f"expression in declaration of '{var}'")
+            if self.next()[1] == ";":
+                return
+
+    def balanced_length(self, i=None):
+        """Number of tokens of the balanced group at token i, current by default"""
+        i = self.i if i is None else i
+        open_ = self.tokens[i][1]
+        close = {"(": ")", "[": "]", "{": "}"}[open_]
+        depth = 0
+        for n, (_, t) in enumerate(self.tokens[i:]):
+            if t == open_:
+                depth += 1
+            elif t == close:
+                depth -= 1
+                if depth == 0:
+                    return n + 1
+        raise Unsupported("unbalanced brackets")
+
+
+class SVFileParser:
+    """Parse systemverilog file with a pure python tokenizer
+
+    Handles class headers and class-scope data declarations only, files
+    using anything it does not understand with confidence are parsed by
+    the fallback backend.
+    """
+
+    backend = "lite"
+    # backend parsing the files the lite parser rejects
+    fallback = "verible"
+    lite_version = "2"
+    # {path: error} of the files neither the lite parser nor the fallback
+    # backend could parse, in the last parse_files()
+    errors = {}
+
+    def __init__(self, filepath, exclude):
+        self.filepath = filepath
+        self.exclude = exclude
+        self.reason = None
+        with open(filepath, 'r') as f:
+            src = f.read()
+        Trace.count("bytes read", len(src))
+        try:
+            with Trace.span("lite.parse"):
+                self.classes = LiteParser(src).parse()
+            Trace.count("files parsed")
+        except Unsupported as e:
+            self.classes = None
+            self.reason = str(e)
+            Trace.count("lite rejected")
+
+    @classmethod
+    def fallback_parser(cls):
+        return get_backend(cls.fallback)
+
+    @classmethod
+    def version(cls):
+        """Lite parser version and fallback backend identity"""
+        try:
+            fallback = cls.fallback_parser()
+            fallback_version = fallback.version()
+        except (ImportError, OSError):
+            return f"{cls.lite_version}/{cls.fallback}:unavailable"
+        return f"{cls.lite_version}/{fallback.backend}:{fallback_version}"
+
+    def parse_classes(self):
+        if self.classes is None:
+            try:
+                return self.fallback_parser()(self.filepath, self.exclude).parse_classes()
+            except (ImportError, OSError) as e:
+                self.errors[self.filepath] = self.fallback_error(self.reason, e)
+                return None
+        return self.classes
+
+    @classmethod
+    def fallback_error(cls, reason, e):
+        return f"{reason}, and the {cls.fallback} fallback is unavailable: {type(e).__name__}: {e}"
+
+    @classmethod
+    def parse_files(cls, paths, exclude, jobs=1):
+        """Parse paths, the ones the lite parser rejects in one fallback batch
+
+        Returns {path: classes} in the order of paths. Files the fallback
+        backend cannot parse, e.g. when it is not installed, are left out
+        and recorded in cls.errors.
+        """
+        paths = list(dict.fromkeys(paths))
+        results = {}
+        rejected = {}
+        for p in paths:
+            parser = cls(p, exclude)
+            if parser.classes is None:
+                rejected[p] = parser.reason
+            else:
+                results[p] = parser.classes
+        errors = {}
+        if rejected:
+            try:
+                fallback = cls.fallback_parser()
+                results.update(fallback.parse_files(list(rejected), exclude, jobs))
+                errors.update(getattr(fallback, "errors", {}))
+            except (ImportError, OSError) as e:
+                errors.update((p, cls.fallback_error(reason, e)) for p, reason in rejected.items())
+        cls.errors = errors
+        return {p: results[p] for p in paths if p in results}
+
+    @classmethod
+    def conformance(cls, paths, exclude, jobs=1):
+        """Compare lite results with the verible backend
+
+        Returns (nb_checked, nb_rejected, mismatches), mismatches being a
+        list of (path, lite classes, verible classes).
+        """
+        verible = get_backend("verible")
+        lite = {}
+        rejected = 0
+        for p in dict.fromkeys(paths):
+            classes = cls(p, exclude).classes
+            if classes is None:
+                rejected += 1
+            else:
+                lite[p] = classes
+        expected = verible.parse_files(list(lite), exclude, jobs)
+        mismatches = [(p, classes, expected.get(p))
+                      for p, classes in lite.items()
+                      if classes != [dict(c, properties=[tuple(x) for x in c['properties']])
+                                     for c in expected.get(p) or []]]
+        return len(lite), rejected, mismatches
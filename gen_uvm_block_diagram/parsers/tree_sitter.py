@@ -1,80 +1,244 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 from tree_sitter import Language, Parser
 
+from ..Trace import Trace
+from . import split_chunks
+
 
 class SVFileParser:
     """Parse systemverilog file with treesitter"""
 
-    SV_LIB = "/home/antoine/.local/share/nvim/site/pack/packer/start/nvim-treesitter/parser/verilog.so"
-    SV_LANG = Language(SV_LIB, 'verilog')
-    PARSER = Parser()
-    PARSER.set_language(SV_LANG)
-
+    backend = "tree_sitter"
+    SV_LIB = os.environ.get(
+        "TREE_SITTER_VERILOG",
+        "/home/antoine/.local/share/nvim/site/pack/packer/start/nvim-treesitter/parser/verilog.so")
+    # language, parser and queries, set by load() on first use
+    SV_LANG = None
+    PARSER = None
     query = {}
-    query["class"] = SV_LANG.query("(class_declaration) @class")
-    query["class.name"] = SV_LANG.query("""
-            (class_declaration
-                (class_identifier
-                    (simple_identifier) @class.name
-                )
-            )""")
-    query["class.type"] = SV_LANG.query("""
-            (class_declaration
-                (class_type
+    # number of chunks handed to each worker, smooths out uneven chunks
+    chunks_per_job = 4
+
+    @classmethod
+    def load(cls):
+        """Load the grammar library and compile the queries, once"""
+        if cls.SV_LANG is not None:
+            return
+        lang = Language(cls.SV_LIB, 'verilog')
+        parser = Parser()
+        parser.set_language(lang)
+
+        query = {}
+        query["class"] = lang.query("(class_declaration) @class")
+        query["class.name"] = lang.query("""
+                (class_declaration
                     (class_identifier
-                        (simple_identifier) @class.type
+                        (simple_identifier) @class.name
+                    )
+                )""")
+        query["class.type"] = lang.query("""
+                (class_declaration
+                    (class_type
+                        (class_identifier
+                            (simple_identifier) @class.type
+                        )
+                    )
+                )""")
+        query["class.property"] = lang.query("""
+                (class_item
+                  (class_property
+                    (data_declaration
+                      (data_type_or_implicit1) @class.property.type
+                      (list_of_variable_decl_assignments) @class.property.variable
+                    )
+                  )
+                )""")
+        query["simple_identifier"] = lang.query(
+            """(simple_identifier) @simple_identifier""")
+        # all the above in one query, captures come in document order
+        query["class.all"] = lang.query("""
+                (class_declaration) @class
+                (class_declaration
+                    (class_identifier
+                        (simple_identifier) @class.name
                     )
                 )
-            )""")
-    query["class.property"] = SV_LANG.query("""
-            (class_item
-              (class_property
-                (data_declaration
-                  (data_type_or_implicit1) @class.property.type
-                  (list_of_variable_decl_assignments) @class.property.variable
+                (class_declaration
+                    (class_type
+                        (class_identifier
+                            (simple_identifier) @class.type
+                        )
+                    )
                 )
-              )
-            )""")
-    query["simple_identifier"] = SV_LANG.query(
-        """(simple_identifier) @simple_identifier""")
+                (class_item
+                  (class_property
+                    (data_declaration
+                      (data_type_or_implicit1) @class.property.type
+                      (list_of_variable_decl_assignments) @class.property.variable
+                    )
+                  )
+                )""")
+        cls.query = query
+        cls.PARSER = parser
+        cls.SV_LANG = lang
 
     def __init__(self, filepath, exclude):
+        self.load()
         self.src_code = bytes(open(filepath, 'r').read(), "utf8")
-        self.root_node = self.PARSER.parse(self.src_code).root_node
+        self.parser = self.PARSER
+        with Trace.span("tree_sitter.parse"):
+            self.tree = self.parser.parse(self.src_code)
+        Trace.count("files parsed")
+        Trace.count("bytes read", len(self.src_code))
+        self.root_node = self.tree.root_node
         self.exclude = exclude
+        # [(start_byte, end_byte, class_info)] kept up to date by edit()
+        self.class_records = None
+
+    @classmethod
+    def parse_chunk(cls, paths, exclude):
+        """Parse and extract paths, return {path: classes}"""
+        return {p: cls(p, exclude).parse_classes() for p in paths}
+
+    @classmethod
+    def parse_chunk_job(cls, paths, exclude):
+        """parse_chunk in a worker process, with the trace it recorded"""
+        return cls.parse_chunk(paths, exclude), Trace.drain()
+
+    @classmethod
+    def parse_files(cls, paths, exclude, jobs=1):
+        """Parse and extract paths in size-balanced chunks on a pool of jobs
+        workers
+
+        Processes, not threads: py-tree-sitter holds the GIL while parsing.
+        Returns {path: classes} in the order of paths, whatever jobs is.
+        """
+        paths = list(dict.fromkeys(paths))
+        cls.load()
+        chunks = split_chunks(paths, jobs * cls.chunks_per_job) if jobs > 1 else [paths]
+        if len(chunks) <= 1:
+            return cls.parse_chunk(paths, exclude)
+        results = {}
+        with ProcessPoolExecutor(max_workers=min(jobs, len(chunks)), initializer=Trace.init_worker,
+                                 initargs=(Trace.enabled,)) as executor:
+            for r, trace in executor.map(cls.parse_chunk_job, chunks, [exclude] * len(chunks)):
+                results.update(r)
+                Trace.merge(trace)
+        return {p: results[p] for p in paths}
+
+    @classmethod
+    def version(cls):
+        """Grammar library identity, part of parse cache keys"""
+        st = os.stat(cls.SV_LIB)
+        return f"{os.path.basename(cls.SV_LIB)}:{st.st_size}:{st.st_mtime_ns}"
 
     def node_str(self, node):
         return self.src_code[node.start_byte:node.end_byte].decode("utf8") if node else ""
 
-    def parse_classes(self):
-        classes = []
-        for node_class, _ in self.query["class"].captures(self.root_node):
-            class_info = {
-                    "name": "",
-                    "type": "",
-                    "properties": [],
-                    }
-            # class.name
-            c = self.query["class.name"].captures(node_class)
-            assert len(c) == 1
-            node_class_name, _ = c[0]
-            class_info['name'] = self.node_str(node_class_name)
-
-            # class.type
-            c = self.query["class.type"].captures(node_class)
-            node_class_type = None
-            if c:
-                assert len(c) == 1
-                node_class_type, _ = c[0]
-            class_info['type'] = self.node_str(node_class_type)
-
-            # class.property
-            c = self.query["class.property"].captures(node_class)
-            type = None
-            for node, capture_name in c:
-                if capture_name == "class.property.type":
-                    type = self.node_str(node)
-                else:
-                    var = self.node_str(node)
-                    class_info['properties'].append([type, var])
-            classes.append(class_info)
-        return classes
+    @staticmethod
+    def node_key(node):
+        return (node.start_byte, node.end_byte)
+
+    def parse_classes(self, root_node=None):
+        """Extract classes with a single query over the tree
+
+        Name and type captures belong to the class declaring them, property
+        captures to every class enclosing them.
+        """
+        classes = {}
+        property_types = {}
+        with Trace.span("tree_sitter.query"):
+            captures = self.query["class.all"].captures(root_node or self.root_node)
+        for node, capture_name in captures:
+            if capture_name == "class":
+                classes[self.node_key(node)] = {
+                        "name": "",
+                        "type": "",
+                        "properties": [],
+                        }
+            elif capture_name == "class.name":
+                class_info = classes[self.node_key(node.parent.parent)]
+                assert not class_info['name']
+                class_info['name'] = self.node_str(node)
+            elif capture_name == "class.type":
+                class_info = classes[self.node_key(node.parent.parent.parent)]
+                assert not class_info['type']
+                class_info['type'] = self.node_str(node)
+            else:
+                text = self.node_str(node)
+                parent = node.parent
+                while parent:
+                    key = self.node_key(parent)
+                    if parent.type == "class_declaration" and key in classes:
+                        if capture_name == "class.property.type":
+                            property_types[key] = text
+                        else:
+                            classes[key]['properties'].append([property_types.get(key), text])
+                    parent = parent.parent
+        return list(classes.values())
+
+    def point(self, byte):
+        """(row, column) of a byte offset in the current source"""
+        row = self.src_code.count(b"\n", 0, byte)
+        return (row, byte - (self.src_code.rfind(b"\n", 0, byte) + 1))
+
+    def classes(self):
+        """Same as parse_classes, reusing records not touched by edits"""
+        if self.class_records is None:
+            nodes = [n for n, _ in self.query["class"].captures(self.root_node)]
+            self.class_records = [
+                    (*self.node_key(n), class_info)
+                    for n, class_info in zip(nodes, self.parse_classes())]
+        return [class_info for _, _, class_info in self.class_records]
+
+    def edit(self, start_byte, old_end_byte, new_text):
+        """Replace source bytes [start_byte, old_end_byte) with new_text
+
+        The previous tree is edited and reused by the parser, then only the
+        classes intersecting the changed ranges are extracted again.
+        Returns the updated classes.
+        """
+        if self.class_records is None:
+            self.classes()
+        new_bytes = new_text.encode("utf8") if isinstance(new_text, str) else new_text
+        new_end_byte = start_byte + len(new_bytes)
+        start_point = self.point(start_byte)
+        old_end_point = self.point(old_end_byte)
+        self.src_code = self.src_code[:start_byte] + new_bytes + self.src_code[old_end_byte:]
+        self.tree.edit(start_byte=start_byte, old_end_byte=old_end_byte,
+                       new_end_byte=new_end_byte, start_point=start_point,
+                       old_end_point=old_end_point,
+                       new_end_point=self.point(new_end_byte))
+        new_tree = self.parser.parse(self.src_code, self.tree)
+        # get_changed_ranges() before py-tree-sitter 0.21
+        changed_ranges = getattr(self.tree, "changed_ranges", None) or self.tree.get_changed_ranges
+        changed = [(r.start_byte, r.end_byte) for r in changed_ranges(new_tree)]
+        changed.append((start_byte, new_end_byte))
+        self.tree = new_tree
+        self.root_node = new_tree.root_node
+
+        # records of classes untouched by the edit, in new coordinates
+        delta = new_end_byte - old_end_byte
+        kept = {}
+        for start, end, class_info in self.class_records:
+            if end <= start_byte:
+                kept[(start, end)] = class_info
+            elif start >= old_end_byte:
+                kept[(start + delta, end + delta)] = class_info
+
+        def is_changed(start, end):
+            return any(s < end and start < e or s == e and start <= s <= end
+                       for s, e in changed)
+
+        records = []
+        for n, _ in self.query["class"].captures(self.root_node):
+            key = self.node_key(n)
+            if key in kept and not is_changed(*key):
+                class_info = kept[key]
+            else:
+                class_info = self.parse_classes(n)[0]
+            records.append((*key, class_info))
+        self.class_records = records
+        return self.classes()
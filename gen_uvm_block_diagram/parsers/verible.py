@@ -1,72 +1,350 @@
 #!/usr/bin/env python3
 
-import anytree
+import asyncio
+import collections
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-from .verible_verilog_syntax import VeribleVerilogSyntax
+from ..Trace import Trace
+from . import split_chunks
+from .verible_verilog_syntax import (LevelOrderTreeIterator, PreOrderTreeIterator,
+                                     VeribleVerilogSyntax, kill_process_group)
+
+
+# Tree helpers: find_all(node, tags, pre_order=False) yields the nodes with
+# one of tags in node's subtree, in level order unless pre_order, on either
+# the json tree exported by verible or a Node/CompactNode tree
+
+IDENTIFIER_TAGS = ("SymbolIdentifier", "EscapedIdentifier")
+
+
+def json_level_order(node):
+    queue = collections.deque([node])
+    while queue:
+        n = queue.popleft()
+        if n is None:
+            continue
+        yield n
+        if "children" in n:
+            queue.extend(n["children"])
+
+
+def json_pre_order(node):
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if n is None:
+            continue
+        yield n
+        if "children" in n:
+            stack.extend(reversed(n["children"]))
+
+
+def json_find_all(node, tags, pre_order=False):
+    iter_ = json_pre_order if pre_order else json_level_order
+    return (n for n in iter_(node) if n.get("tag") in tags)
+
+
+def node_find_all(node, tags, pre_order=False):
+    iter_ = PreOrderTreeIterator if pre_order else LevelOrderTreeIterator
+    return node.iter_find_all({"tag": list(tags)}, iter_=iter_)
+
+
+def extract_classes(tree, find_all, text):
+    """Classes declared in a syntax tree
+
+    find_all is one of the helpers above, text(node) the source of a node.
+    """
+    def find(node, tags, pre_order=False):
+        return next(iter(find_all(node, tags, pre_order)), None)
+
+    classes = []
+    for cl in find_all(tree, ("kClassDeclaration",)):
+        class_info = {
+            "name": "",
+            "type": "",
+            "properties": [],
+        }
+
+        header = find(cl, ("kClassHeader",))
+        if not header:
+            continue
+
+        # class name
+        name = find(header, IDENTIFIER_TAGS, pre_order=True)
+        if not name:
+            continue
+        class_info["name"] = text(name)
+
+        # class type
+        type = find(header, ("kExtendsList",))
+        if type:
+            type_id = find(type, IDENTIFIER_TAGS)
+            if type_id:
+                class_info["type"] = text(type_id)
+
+        # properties
+        items = find(cl, ("kClassItems",))
+        if items:
+            for data_decl in find_all(items, ("kDataDeclaration",)):
+                # newer verible versions have virtual interfaces as
+                # kInterfaceType, modports as kReference
+                type = find(data_decl, ("kDataType", "kInterfaceType", "kReference"))
+                if not type:
+                    continue
+                type_name = find(type, IDENTIFIER_TAGS)
+                if not type_name:
+                    continue
+                var_list = find(data_decl, ("kVariableDeclarationAssignmentList",))
+                if var_list:
+                    var_names = find_all(var_list, IDENTIFIER_TAGS)
+                else:
+                    # and declarations in methods as kRegisterVariables,
+                    # whose initializers often call the factory
+                    var_names = (find(v, IDENTIFIER_TAGS, pre_order=True)
+                                 for v in find_all(data_decl, ("kRegisterVariable",)))
+                for var_name in var_names:
+                    if var_name:
+                        class_info['properties'].append(
+                            (text(type_name), text(var_name)))
+
+        classes.append(class_info)
+    return classes
 
 
 class SVFileParser:
-    parser = VeribleVerilogSyntax(
-        executable="/home/antoine/src/verible-v0.0-2474-g21acfbef/bin/verible-verilog-syntax")
+    backend = "verible"
+    parser = VeribleVerilogSyntax(executable=os.environ.get(
+        "VERIBLE_VERILOG_SYNTAX",
+        "/home/antoine/src/verible-v0.0-2474-g21acfbef/bin/verible-verilog-syntax"))
+    # number of chunks handed to each worker, smooths out uneven chunks
+    chunks_per_job = 4
+    # files per verible process, bounds its command line and the json held
+    # in memory at once
+    max_chunk_files = 256
+    # "json" extracts classes from the decoded json, "node" builds a Node tree
+    tree_format = "json"
+    # seconds verible may spend per file, parse_files() runs verible with
+    # parse_files_async() when set
+    timeout = None
+    # attempts left to a file that failed on its own before it is skipped
+    retries = 1
+    # {path: error} of the files skipped by the last parse_files()
+    errors = {}
+    _version = None
 
-    def __init__(self, filepath, exclude):
-        data = self.parser.parse_files([filepath])
-        for file_path, file_data in data.items():
-            self.data = file_data
+    def __init__(self, filepath, exclude, data=None):
+        if data is None:
+            data = self.parser.parse_files([filepath], self.options())
+            for file_path, file_data in data.items():
+                data = file_data
+        self.data = data
         self.exclude = exclude
 
+    @classmethod
+    def options(cls):
+        return {"tree_format": cls.tree_format}
+
+    @classmethod
+    def version(cls):
+        """verible-verilog-syntax version string, part of parse cache keys"""
+        if cls._version is None:
+            try:
+                proc = subprocess.run([cls.parser.executable, "--version"],
+                                      stdout=subprocess.PIPE, encoding="utf-8",
+                                      check=False)
+                cls._version = proc.stdout.strip().split('\n')[0]
+            except OSError:
+                cls._version = ""
+        return cls._version
+
+    @classmethod
+    def chunks(cls, paths, nb):
+        """Split paths in about nb size-balanced chunks of at most
+        max_chunk_files paths"""
+        n = cls.max_chunk_files
+        nb = max(nb, -(-len(paths) // n))
+        return [c[i:i + n] for c in split_chunks(paths, nb) for i in range(0, len(c), n)]
+
+    @classmethod
+    def parse_chunk(cls, paths, exclude, errors):
+        """Parse paths with a single verible call, return {path: classes}
+
+        When its output does not decode, e.g. verible crashed on one of the
+        files, paths are parsed again one per call, the files still failing
+        are skipped with their error recorded in errors.
+        """
+        try:
+            data = cls.parser.parse_files(paths, cls.options())
+        except ValueError as e:
+            if len(paths) > 1:
+                results = {}
+                for p in paths:
+                    results.update(cls.parse_chunk([p], exclude, errors))
+                return results
+            Trace.count("verible files skipped")
+            errors[paths[0]] = f"{type(e).__name__}: {e}"
+            return {}
+        with Trace.span("verible.extract", files=len(data)):
+            return {p: cls(p, exclude, data[p]).parse_classes()
+                    for p in paths if p in data}
+
+    @classmethod
+    def parse_chunk_job(cls, paths, exclude):
+        """parse_chunk in a worker process, with the errors and the trace it
+        recorded"""
+        errors = {}
+        return cls.parse_chunk(paths, exclude, errors), errors, Trace.drain()
+
+    @classmethod
+    def parse_files(cls, paths, exclude, jobs=1):
+        """Parse paths in size-balanced chunks on a pool of jobs workers
+
+        Files verible fails on are skipped, with their error recorded in
+        cls.errors. Returns {path: classes} in the order of paths.
+        """
+        paths = list(dict.fromkeys(paths))
+        if not paths:
+            return {}
+        results = {}
+        cls.errors = {}
+        if cls.timeout is not None:
+            return asyncio.run(cls.parse_files_async(paths, exclude, jobs))
+        chunks = cls.chunks(paths, jobs * cls.chunks_per_job if jobs > 1 else 1)
+        if jobs <= 1 or len(chunks) == 1:
+            # no pool for one chunk, it would fork jobs copies of the process
+            for chunk in chunks:
+                results.update(cls.parse_chunk(chunk, exclude, cls.errors))
+        else:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(chunks)), initializer=Trace.init_worker,
+                                     initargs=(Trace.enabled,)) as executor:
+                for r, errors, trace in executor.map(cls.parse_chunk_job, chunks,
+                                                     [exclude] * len(chunks)):
+                    results.update(r)
+                    cls.errors.update(errors)
+                    Trace.merge(trace)
+        return {p: results[p] for p in paths if p in results}
+
+    @classmethod
+    def extract(cls, paths, output, options, exclude):
+        """Decode the stdout of a verible run on paths, return {path: classes}"""
+        data = cls.parser._parse_output(output.decode("utf-8"), None, options)
+        with Trace.span("verible.extract", files=len(data)):
+            return {p: cls(p, exclude, data[p]).parse_classes()
+                    for p in paths if p in data}
+
+    @classmethod
+    def extract_job(cls, paths, output, options, exclude):
+        """extract in a worker process, with the trace it recorded"""
+        return cls.extract(paths, output, options, exclude), Trace.drain()
+
+    @classmethod
+    async def run_verible(cls, paths, options, timeout=None):
+        """stdout bytes of one verible process, killed after timeout seconds"""
+        proc = await asyncio.create_subprocess_exec(
+            cls.parser.executable, *cls.parser._args(options), *paths,
+            stdout=asyncio.subprocess.PIPE, start_new_session=True)
+        try:
+            stdout, _ = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            kill_process_group(proc)
+            await proc.wait()
+            raise
+        return stdout
+
+    @classmethod
+    async def parse_files_async(cls, paths, exclude, jobs=1, timeout=None, retries=None):
+        """Parse paths with at most jobs verible processes running at once
+
+        The output of a chunk is decoded and its classes are extracted on a
+        pool of jobs workers as soon as its process is done, the event loop
+        only waits on processes. A chunk gets timeout seconds per file
+        (default cls.timeout, None for no limit). A chunk that times out,
+        crashes verible or crashes the worker extracting it is parsed again
+        one file per process, a single file is retried retries times
+        (default cls.retries), then skipped with its error recorded in
+        cls.errors.
+
+        Returns {path: classes} in the order of paths.
+        """
+        paths = list(dict.fromkeys(paths))
+        timeout = cls.timeout if timeout is None else timeout
+        retries = cls.retries if retries is None else retries
+        options = cls.parser._options(cls.options())
+        slots = asyncio.Semaphore(max(1, jobs))
+        loop = asyncio.get_running_loop()
+        results = {}
+        errors = {}
+        chunks = cls.chunks(paths, max(1, jobs) * cls.chunks_per_job) if paths else []
+
+        def new_executor():
+            return ProcessPoolExecutor(max_workers=min(jobs, len(chunks)), initializer=Trace.init_worker,
+                                       initargs=(Trace.enabled,))
+
+        # with one job, nothing runs while a chunk is extracted
+        executor = new_executor() if jobs > 1 and len(chunks) > 1 else None
+
+        async def extract(chunk, output):
+            nonlocal executor
+            if executor is None:
+                return cls.extract(chunk, output, options, exclude)
+            used = executor
+            try:
+                r, trace = await loop.run_in_executor(
+                    used, cls.extract_job, chunk, output, options, exclude)
+            except BrokenProcessPool:
+                # a worker died, its pool fails every pending chunk, the
+                # ones extracted next get a new pool
+                if executor is used:
+                    used.shutdown(wait=False)
+                    executor = new_executor()
+                raise
+            Trace.merge(trace)
+            return r
+
+        async def parse(chunk, attempt=0):
+            async with slots:
+                try:
+                    with Trace.span("verible.subprocess", cpu=False, files=len(chunk)):
+                        output = await cls.run_verible(
+                            chunk, options, timeout and timeout * len(chunk))
+                    results.update(await extract(chunk, output))
+                    return
+                except asyncio.TimeoutError:
+                    error = f"verible timed out after {timeout * len(chunk):g} s"
+                except (OSError, ValueError, BrokenProcessPool) as e:
+                    error = f"{type(e).__name__}: {e}"
+            # the slot is released, the failed files queue up again
+            if len(chunk) > 1:
+                await asyncio.gather(*(parse([p]) for p in chunk))
+            elif attempt < retries:
+                Trace.count("verible retries")
+                await parse(chunk, attempt + 1)
+            else:
+                Trace.count("verible files skipped")
+                errors[chunk[0]] = error
+
+        try:
+            await asyncio.gather(*(parse(c) for c in chunks))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        cls.errors = errors
+        return {p: results[p] for p in paths if p in results}
+
+    def text(self, token):
+        source_code = self.data.source_code
+        if source_code and token["end"] <= len(source_code):
+            return source_code[token["start"]:token["end"]].decode("utf-8")
+        return ""
+
     def parse_classes(self):
+        if self.data.tree_json is not None:
+            if "children" not in self.data.tree_json:
+                return
+            return extract_classes(self.data.tree_json, json_find_all, self.text)
         if not self.data.tree:
             return
-        classes = []
-        for cl in self.data.tree.iter_find_all({"tag": "kClassDeclaration"}):
-            class_info = {
-                "name": "",
-                "type": "",
-                "properties": [],
-            }
-
-            header = cl.find({"tag": "kClassHeader"})
-            if not header:
-                continue
-
-            # class name
-            name = header.find({"tag": ["SymbolIdentifier", "EscapedIdentifier"]},
-                               iter_=anytree.PreOrderIter)
-            if not name:
-                continue
-            class_info["name"] = name.text
-
-            # class type
-            type = header.find({"tag": "kExtendsList"})
-            if type:
-                type_id = type.find(
-                    {"tag": ["SymbolIdentifier", "EscapedIdentifier"]})
-                if type_id:
-                    class_info["type"] = type_id.text
-
-            # properties
-            items = cl.find({"tag": "kClassItems"})
-            if items:
-                for data_decl in items.iter_find_all({"tag": ["kDataDeclaration"]}):
-                    if not data_decl:
-                        continue
-                    type = data_decl.find({"tag": "kDataType"})
-                    if not type:
-                        continue
-                    type_name = type.find(
-                        {"tag": ["SymbolIdentifier", "EscapedIdentifier"]})
-                    if not type_name:
-                        continue
-                    var_list = data_decl.find(
-                        {"tag": "kVariableDeclarationAssignmentList"})
-                    if not var_list:
-                        continue
-                    for var_name in var_list.iter_find_all(
-                            {"tag": ["SymbolIdentifier", "EscapedIdentifier"]}):
-                        if var_name:
-                            class_info['properties'].append(
-                                (type_name.text, var_name.text))
-
-            classes.append(class_info)
-        return classes
+        return extract_classes(self.data.tree, node_find_all, lambda n: n.text)
@@ -13,15 +13,22 @@
 # limitations under the License.
 """Wrapper for ``verible-verilog-syntax --export_json``"""
 
+import array
+import bisect
 import collections
 import json
+import os
 import re
+import signal
 import subprocess
-from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+import sys
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 import anytree
 import dataclasses
 
+from ..Trace import Trace
+
 _CSI_SEQUENCE = re.compile("\033\\[.*?m")
 
 
@@ -43,6 +50,21 @@ TreeIterator = Union["_TreeIteratorBase", anytree.iterators.AbstractIter]
 
 # Custom tree iterators with an option for reverse children iteration
 
+def kill_process_group(proc) -> None:
+  """Kill proc and the processes it started.
+
+  proc has to run in its own session (``start_new_session=True``), children
+  of a wrapper script would otherwise keep its pipes open.
+
+  Args:
+    proc: subprocess.Popen or asyncio.subprocess.Process.
+  """
+  try:
+    os.killpg(proc.pid, signal.SIGKILL)
+  except (AttributeError, OSError):
+    proc.kill()
+
+
 class _TreeIteratorBase:
   def __init__(self, tree: "Node",
                filter_: Optional[CallableFilter] = None,
@@ -90,6 +112,112 @@ class LevelOrderTreeIterator(_TreeIteratorBase):
       queue.extend(self._iter_children(n))
 
 
+# Filters
+
+_MISSING = object()
+_compiled_filters: Dict[tuple, CallableFilter] = {}
+_tag_filters: Dict[tuple, Optional[frozenset]] = {}
+
+
+def _filter_values(value) -> Union[frozenset, list]:
+  values = value if isinstance(value, list) else [value]
+  try:
+    return frozenset(values)
+  except TypeError:
+    return values
+
+
+def _tag_filter(filter_) -> Optional[frozenset]:
+  """Searched tags of a ``{"tag": ...}`` filter, None for other filters."""
+  if type(filter_) is not dict or len(filter_) != 1:
+    return None
+  value = filter_.get("tag", _MISSING)
+  key = tuple(value) if isinstance(value, list) else (value,)
+  try:
+    return _tag_filters[key]
+  except KeyError:
+    pass
+  except TypeError:
+    return None
+  tags = frozenset(key) if all(isinstance(t, str) for t in key) else None
+  _tag_filters[key] = tags
+  return tags
+
+
+def _compile_filter(filter_: Union[CallableFilter, KeyValueFilter, None]) \
+                    -> Optional[CallableFilter]:
+  """Turn a dict filter into a predicate, callables are returned as is.
+
+  Predicates of hashable dict filters are compiled once and reused.
+  """
+  if not filter_ or callable(filter_):
+    return filter_
+  checks = tuple((attr, _filter_values(value))
+                 for attr, value in filter_.items())
+  try:
+    return _compiled_filters[checks]
+  except (KeyError, TypeError):
+    pass
+  def f(node):
+    for attr, values in checks:
+      try:
+        if getattr(node, attr, _MISSING) not in values:
+          return False
+      except TypeError:
+        # unhashable attribute never equals a hashable searched value
+        return False
+    return True
+  try:
+    _compiled_filters[checks] = f
+  except TypeError:
+    pass
+  return f
+
+
+class _TagIndex:
+  """Tag to nodes index of a Node tree.
+
+  Every node gets its pre-order number, the pre-order number of the last
+  node of its subtree and its depth, so nodes with given tags under any
+  subtree are found by bisecting per-tag lists.
+  """
+  def __init__(self, root: "Node"):
+    self.nodes: Dict[str, List["Node"]] = {}
+    self.pres: Dict[str, List[int]] = {}
+    order = []
+    stack = [(root, 0)]
+    while stack:
+      node, depth = stack.pop()
+      node._pre = len(order)
+      node._depth = depth
+      order.append(node)
+      tag = getattr(node, "tag", None)
+      if tag is not None:
+        self.nodes.setdefault(tag, []).append(node)
+      stack.extend((c, depth + 1) for c in reversed(node.children))
+    for node in reversed(order):
+      node._last = node.children[-1]._last if node.children else node._pre
+    for tag, nodes in self.nodes.items():
+      self.pres[tag] = [n._pre for n in nodes]
+
+  def find_all(self, node: "Node", tags: frozenset,
+               level_order: bool) -> List["Node"]:
+    """Nodes with one of tags in node's subtree, in level or pre order."""
+    result = []
+    for tag in tags:
+      pres = self.pres.get(tag)
+      if not pres:
+        continue
+      lo = bisect.bisect_left(pres, node._pre)
+      hi = bisect.bisect_right(pres, node._last, lo)
+      result.extend(self.nodes[tag][lo:hi])
+    if level_order:
+      result.sort(key=lambda n: (n._depth, n._pre))
+    elif len(tags) > 1:
+      result.sort(key=lambda n: n._pre)
+    return result
+
+
 class Node(anytree.NodeMixin):
   """Base VeribleVerilogSyntax syntax tree node.
 
@@ -99,6 +227,12 @@ class Node(anytree.NodeMixin):
   def __init__(self, parent: Optional["Node"] = None):
     self.parent = parent
 
+  def _post_attach(self, parent: "Node") -> None:
+    RootNode.invalidate_index(parent)
+
+  def _post_detach(self, parent: "Node") -> None:
+    RootNode.invalidate_index(parent)
+
   @property
   def syntax_data(self) -> Optional["SyntaxData"]:
     """Parent SyntaxData"""
@@ -114,6 +248,15 @@ class Node(anytree.NodeMixin):
     """Byte offset of a character just past the node in source text."""
     raise NotImplementedError("Subclass must implement 'end' property")
 
+  @property
+  def location(self) -> Optional[Tuple[int, int]]:
+    """(line, column) of node's first character, both zero-based."""
+    start = self.start
+    sd = self.syntax_data
+    if start is None or not sd or sd.source_code is None:
+      return None
+    return sd.line_column(start)
+
   @property
   def text(self) -> str:
     """Source code fragment spanning all tokens in a node."""
@@ -141,19 +284,27 @@ class BranchNode(Node):
     children (Optional[Node]): Child nodes.
   """
   def __init__(self, tag: str, parent: Optional[Node] = None,
-               children: Optional[List[Node]] = None):
+               children: Optional[List[Node]] = None,
+               span: Optional[Tuple[Optional[int], Optional[int]]] = None):
     super().__init__(parent)
     self.tag = tag
     self.children = children if children is not None else []
+    # (start, end) precomputed by VeribleVerilogSyntax._transform_tree,
+    # searched in the subtree when None
+    self._span = span
 
   @property
   def start(self) -> Optional[int]:
+    if self._span is not None:
+      return self._span[0]
     first_token = self.find(lambda n: isinstance(n, TokenNode),
                             iter_=PostOrderTreeIterator)
     return first_token.start if first_token else None
 
   @property
   def end(self) -> Optional[int]:
+    if self._span is not None:
+      return self._span[1]
     last_token = self.find(lambda n: isinstance(n, TokenNode),
                            iter_=PostOrderTreeIterator, reverse_children=True)
     return last_token.end if last_token else None
@@ -176,21 +327,16 @@ class BranchNode(Node):
     Yields:
       Nodes matching specified filter.
     """
-    def as_list(v):
-      return v if isinstance(v, list) else [v]
-
-    if filter_ and not callable(filter_):
-      filters = filter_
-      def f(node):
-        for attr,value in filters.items():
-          if not hasattr(node, attr):
-            return False
-          if getattr(node, attr) not in as_list(value):
-            return False
-        return True
-      filter_ = f
-
-    for node in iter_(self, filter_, **kwargs):
+    tags = _tag_filter(filter_)
+    root = self.root if tags is not None else None
+    if (isinstance(root, RootNode) and not kwargs.get("reverse_children")
+        and iter_ in (LevelOrderTreeIterator, PreOrderTreeIterator)):
+      nodes = root.tag_index.find_all(self, tags,
+                                      iter_ is LevelOrderTreeIterator)
+    else:
+      nodes = iter_(self, _compile_filter(filter_), **kwargs)
+
+    for node in nodes:
       yield node
       max_count -= 1
       if max_count == 0:
@@ -243,10 +389,28 @@ class BranchNode(Node):
 class RootNode(BranchNode):
   """Syntax tree root node."""
   def __init__(self, tag: str, syntax_data: Optional["SyntaxData"] = None,
-               children: Optional[List[Node]] = None):
-    super().__init__(tag, None, children)
+               children: Optional[List[Node]] = None,
+               span: Optional[Tuple[Optional[int], Optional[int]]] = None):
+    self._tag_index = None
+    super().__init__(tag, None, children, span)
     self._syntax_data = syntax_data
 
+  @property
+  def tag_index(self) -> _TagIndex:
+    """Tag to nodes index, built on first use.
+
+    Dropped whenever a node is attached to or detached from the tree.
+    """
+    if self._tag_index is None:
+      self._tag_index = _TagIndex(self)
+    return self._tag_index
+
+  @staticmethod
+  def invalidate_index(node: Node) -> None:
+    root = node.root
+    if isinstance(root, RootNode):
+      root._tag_index = None
+
   @property
   def syntax_data(self) -> Optional["SyntaxData"]:
     return self._syntax_data
@@ -347,6 +511,332 @@ class Token:
     return " ".join(parts)
 
 
+# Compact tree
+#
+# Alternative syntax tree storage: all nodes of a file live in flat arrays,
+# node objects are lightweight views (tree, index) created on access.
+
+_NULL, _TOKEN, _BRANCH = 0, 1, 2
+
+
+class CompactTree:
+  """Syntax tree stored in flat arrays.
+
+  Nodes are numbered in pre-order. Tag strings are interned, each node
+  stores its tag index, span, parent and a range in the ``children`` array.
+
+  Attributes:
+    syntax_data (Optional[SyntaxData]): Parent SyntaxData.
+  """
+  __slots__ = ("syntax_data", "tag_names", "tag_ids", "kinds", "tags",
+               "starts", "ends", "parents", "child_begin", "child_end",
+               "children", "last", "_tag_index", "_depths")
+
+  def __init__(self, tree, syntax_data: Optional["SyntaxData"] = None,
+               skip_null: bool = False):
+    self.syntax_data = syntax_data
+    self.tag_names: List[str] = []
+    self.tag_ids: Dict[str, int] = {}
+    self.kinds = array.array("b")
+    self.tags = array.array("i")
+    self.starts = array.array("q")
+    self.ends = array.array("q")
+    self.parents = array.array("i")
+    self.child_begin = array.array("i")
+    self.child_end = array.array("i")
+    self.children = array.array("i")
+    self.last = array.array("i")
+    self._tag_index = None
+    self._depths = None
+    self._build(tree, skip_null)
+
+  def _intern(self, tag: str) -> int:
+    tag_id = self.tag_ids.get(tag)
+    if tag_id is None:
+      tag_id = self.tag_ids[tag] = len(self.tag_names)
+      self.tag_names.append(sys.intern(tag))
+    return tag_id
+
+  def _build(self, tree, skip_null: bool) -> None:
+    intern = self._intern
+    kinds, tags, parents = self.kinds.append, self.tags.append, self.parents.append
+    starts, ends = self.starts.append, self.ends.append
+    child_begin, child_end = self.child_begin.append, self.child_end.append
+    children = self.children
+    # (json node, parent index, slot in children array)
+    stack = [(tree, -1, -1)]
+    i = -1
+    while stack:
+      node, parent, slot = stack.pop()
+      i += 1
+      if slot >= 0:
+        children[slot] = i
+      parents(parent)
+      if node is None:
+        kinds(_NULL)
+        tags(-1)
+        starts(-1)
+        ends(-1)
+        child_begin(0)
+        child_end(0)
+      elif "children" in node:
+        node_children = [c for c in node["children"]
+                         if not (skip_null and c is None)]
+        begin = len(children)
+        children.extend([-1] * len(node_children))
+        kinds(_BRANCH)
+        tags(intern(node["tag"]))
+        starts(-1)
+        ends(-1)
+        child_begin(begin)
+        child_end(begin + len(node_children))
+        for k in reversed(range(len(node_children))):
+          stack.append((node_children[k], i, begin + k))
+      else:
+        kinds(_TOKEN)
+        tags(intern(node["tag"]))
+        starts(node["start"])
+        ends(node["end"])
+        child_begin(0)
+        child_end(0)
+    # spans and subtree intervals, children are numbered after their parent
+    self.last = array.array("i", range(len(self.kinds)))
+    children = self.children
+    for i in reversed(range(len(self.kinds))):
+      begin, end = self.child_begin[i], self.child_end[i]
+      if begin == end:
+        continue
+      self.last[i] = self.last[children[end - 1]]
+      if self.kinds[i] != _BRANCH:
+        continue
+      for k in range(begin, end):
+        if self.starts[children[k]] >= 0:
+          self.starts[i] = self.starts[children[k]]
+          break
+      for k in reversed(range(begin, end)):
+        if self.ends[children[k]] >= 0:
+          self.ends[i] = self.ends[children[k]]
+          break
+
+  def __len__(self) -> int:
+    return len(self.kinds)
+
+  def node(self, i: int) -> "CompactNode":
+    if i == 0:
+      return CompactRootNode(self, 0)
+    return _COMPACT_NODE_CLASSES[self.kinds[i]](self, i)
+
+  def child_ids(self, i: int) -> "array.array":
+    return self.children[self.child_begin[i]:self.child_end[i]]
+
+  def iter_ids(self, i: int, iter_: TreeIterator,
+               reverse_children: bool = False) -> Optional[Iterable[int]]:
+    """Node indices of subtree i in iter_ order.
+
+    Returns None for iterators other than the ones of this module.
+    """
+    child_ids = self.child_ids
+    if iter_ is PreOrderTreeIterator and not reverse_children:
+      return range(i, self.last[i] + 1)
+    if iter_ is PreOrderTreeIterator:
+      def pre_order():
+        stack = [i]
+        while stack:
+          n = stack.pop()
+          yield n
+          stack.extend(child_ids(n))
+      return pre_order()
+    if iter_ is LevelOrderTreeIterator:
+      def level_order():
+        queue = collections.deque([i])
+        while queue:
+          n = queue.popleft()
+          yield n
+          c = child_ids(n)
+          queue.extend(reversed(c) if reverse_children else c)
+      return level_order()
+    if iter_ is PostOrderTreeIterator:
+      def post_order():
+        stack = [(i, False)]
+        while stack:
+          n, expanded = stack.pop()
+          if expanded:
+            yield n
+            continue
+          stack.append((n, True))
+          c = child_ids(n)
+          stack.extend((k, False) for k in (c if reverse_children
+                                            else reversed(c)))
+      return post_order()
+    return None
+
+  def find_tag_ids(self, i: int, tags: frozenset,
+                   level_order: bool) -> List[int]:
+    """Indices of nodes with one of tags in subtree i, in level or pre order.
+
+    Uses a per-tag index built on first use.
+    """
+    if self._tag_index is None:
+      index = {}
+      for n, tag_id in enumerate(self.tags):
+        if tag_id >= 0:
+          index.setdefault(tag_id, array.array("i")).append(n)
+      self._tag_index = index
+    result = []
+    for tag in tags:
+      ids = self._tag_index.get(self.tag_ids.get(tag, -1))
+      if ids:
+        lo = bisect.bisect_left(ids, i)
+        result.extend(ids[lo:bisect.bisect_right(ids, self.last[i], lo)])
+    if level_order:
+      depths = self.depths()
+      result.sort(key=lambda n: (depths[n], n))
+    elif len(tags) > 1:
+      result.sort()
+    return result
+
+  def depths(self) -> "array.array":
+    if self._depths is None:
+      depths = array.array("i", bytes(4 * len(self.kinds)))
+      parents = self.parents
+      for n in range(1, len(self.kinds)):
+        depths[n] = depths[parents[n]] + 1
+      self._depths = depths
+    return self._depths
+
+
+class CompactNode:
+  """View on a CompactTree node.
+
+  Provides the same interface as Node, without anytree bookkeeping.
+  """
+  __slots__ = ("_tree", "_id")
+
+  def __init__(self, tree: CompactTree, i: int):
+    self._tree = tree
+    self._id = i
+
+  def __eq__(self, other) -> bool:
+    return (isinstance(other, CompactNode) and self._tree is other._tree
+            and self._id == other._id)
+
+  def __hash__(self) -> int:
+    return hash((id(self._tree), self._id))
+
+  @property
+  def syntax_data(self) -> Optional["SyntaxData"]:
+    return self._tree.syntax_data
+
+  @property
+  def parent(self) -> Optional["CompactNode"]:
+    p = self._tree.parents[self._id]
+    return self._tree.node(p) if p >= 0 else None
+
+  @property
+  def children(self) -> tuple:
+    tree = self._tree
+    return tuple(tree.node(c) for c in tree.child_ids(self._id))
+
+  @property
+  def is_leaf(self) -> bool:
+    return self._tree.child_begin[self._id] == self._tree.child_end[self._id]
+
+  @property
+  def root(self) -> "CompactNode":
+    return self._tree.node(0)
+
+  @property
+  def start(self) -> Optional[int]:
+    start = self._tree.starts[self._id]
+    return start if start >= 0 else None
+
+  @property
+  def end(self) -> Optional[int]:
+    end = self._tree.ends[self._id]
+    return end if end >= 0 else None
+
+  location = Node.location
+  text = Node.text
+  __repr__ = Node.__repr__
+
+
+class CompactLeafNode(CompactNode):
+  """Null node view."""
+  __slots__ = ()
+
+  to_formatted_string = LeafNode.to_formatted_string
+
+
+class CompactTokenNode(CompactNode):
+  """Token node view."""
+  __slots__ = ()
+
+  @property
+  def tag(self) -> str:
+    return self._tree.tag_names[self._tree.tags[self._id]]
+
+  to_formatted_string = TokenNode.to_formatted_string
+
+
+class CompactBranchNode(CompactNode):
+  """Branch node view."""
+  __slots__ = ()
+
+  @property
+  def tag(self) -> str:
+    return self._tree.tag_names[self._tree.tags[self._id]]
+
+  def iter_find_all(self, filter_: Union[CallableFilter, KeyValueFilter, None],
+                    max_count: int = 0,
+                    iter_: TreeIterator = LevelOrderTreeIterator,
+                    **kwargs) -> Iterable[CompactNode]:
+    """Iterate all nodes matching specified filter.
+
+    See BranchNode.iter_find_all.
+    """
+    tree = self._tree
+    tags = _tag_filter(filter_)
+    reverse_children = kwargs.get("reverse_children", False)
+    ids = tree.iter_ids(self._id, iter_, reverse_children)
+    if ids is None:
+      nodes = iter_(self, _compile_filter(filter_), **kwargs)
+    elif tags is not None and not reverse_children and \
+         iter_ in (LevelOrderTreeIterator, PreOrderTreeIterator):
+      nodes = map(tree.node, tree.find_tag_ids(
+          self._id, tags, iter_ is LevelOrderTreeIterator))
+    elif tags is not None:
+      tag_ids = {tree.tag_ids[t] for t in tags if t in tree.tag_ids}
+      nodes = (tree.node(i) for i in ids if tree.tags[i] in tag_ids)
+    else:
+      f = _compile_filter(filter_) or (lambda n: True)
+      nodes = (n for n in map(tree.node, ids) if f(n))
+    for node in nodes:
+      yield node
+      max_count -= 1
+      if max_count == 0:
+        break
+
+  find = BranchNode.find
+  find_all = BranchNode.find_all
+  to_formatted_string = BranchNode.to_formatted_string
+
+
+class CompactRootNode(CompactBranchNode):
+  """Root node view, gives access to the underlying CompactTree."""
+  __slots__ = ()
+
+  @property
+  def compact_tree(self) -> CompactTree:
+    return self._tree
+
+
+_COMPACT_NODE_CLASSES = {
+  _NULL: CompactLeafNode,
+  _TOKEN: CompactTokenNode,
+  _BRANCH: CompactBranchNode,
+}
+
+
 @dataclasses.dataclass
 class Error:
   line: int
@@ -358,10 +848,24 @@ class Error:
 @dataclasses.dataclass
 class SyntaxData:
   source_code: Optional[str] = None
-  tree: Optional[RootNode] = None
+  tree: Optional[Union[RootNode, CompactRootNode]] = None
+  tree_json: Optional[Dict[str, Any]] = None
   tokens: Optional[List[Token]] = None
   rawtokens: Optional[List[Token]] = None
   errors: Optional[List[Error]] = None
+  _line_starts: Optional[List[int]] = dataclasses.field(
+      default=None, repr=False, compare=False)
+
+  def line_column(self, offset: int) -> Tuple[int, int]:
+    """Convert byte offset in source code to zero-based (line, column).
+
+    The line index is built on first use and reused for later lookups.
+    """
+    if self._line_starts is None:
+      self._line_starts = [0] + [m.end() for m in
+                                 re.finditer(b"\n", self.source_code or b"")]
+    line = bisect.bisect_right(self._line_starts, offset) - 1
+    return (line, offset - self._line_starts[line])
 
 
 class VeribleVerilogSyntax:
@@ -377,8 +881,16 @@ class VeribleVerilogSyntax:
   def __init__(self, executable: str = "verible-verilog-syntax"):
     self.executable = executable
 
+  @staticmethod
+  def _span(children: List[Node]) -> Tuple[Optional[int], Optional[int]]:
+    start = next((c.start for c in children if c.start is not None), None)
+    end = next((c.end for c in reversed(children) if c.end is not None), None)
+    return (start, end)
+
   @staticmethod
   def _transform_tree(tree, data: SyntaxData, skip_null: bool) -> RootNode:
+    span = VeribleVerilogSyntax._span
+
     def transform(tree):
       if tree is None:
         return None
@@ -389,7 +901,7 @@ class VeribleVerilogSyntax:
             if not (skip_null and child is None)
         ]
         tag = tree["tag"]
-        return BranchNode(tag, children=children)
+        return BranchNode(tag, children=children, span=span(children))
       tag = tree["tag"]
       start = tree["start"]
       end = tree["end"]
@@ -404,7 +916,8 @@ class VeribleVerilogSyntax:
         if not (skip_null and child is None)
     ]
     tag = tree["tag"]
-    return RootNode(tag, syntax_data=data, children=children)
+    return RootNode(tag, syntax_data=data, children=children,
+                    span=span(children))
 
 
   @staticmethod
@@ -417,17 +930,22 @@ class VeribleVerilogSyntax:
     return [Error(t["line"], t["column"], t["phase"], t.get("message", None))
         for t in tokens]
 
-  def _parse(self, paths: List[str], input_: str = None,
-             options: Dict[str, Any] = None) -> Dict[str, SyntaxData]:
-    """Common implementation of parse_* methods"""
-    options = {
+  @staticmethod
+  def _options(options: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Parsing options with their defaults"""
+    return {
       "gen_tree": True,
+      "tree_format": "node",
       "skip_null": False,
       "gen_tokens": False,
       "gen_rawtokens": False,
+      "timeout": None,
       **(options or {}),
     }
 
+  @staticmethod
+  def _args(options: Dict[str, Any]) -> List[str]:
+    """verible-verilog-syntax flags, before the paths"""
     args = ["-export_json"]
     if options["gen_tree"]:
       args.append("-printtree")
@@ -435,14 +953,46 @@ class VeribleVerilogSyntax:
       args.append("-printtokens")
     if options["gen_rawtokens"]:
       args.append("-printrawtokens")
+    return args
 
-    proc = subprocess.run([self.executable, *args , *paths],
-        stdout=subprocess.PIPE,
-        input=input_,
-        encoding="utf-8",
-        check=False)
+  def _parse(self, paths: List[str], input_: str = None,
+             options: Dict[str, Any] = None) -> Dict[str, SyntaxData]:
+    """Common implementation of parse_* methods
+
+    Raises:
+      subprocess.TimeoutExpired: verible ran longer than options["timeout"]
+        seconds, it has been killed.
+    """
+    options = self._options(options)
+
+    with Trace.span("verible.subprocess", files=len(paths)):
+      with subprocess.Popen([self.executable, *self._args(options), *paths],
+          stdin=None if input_ is None else subprocess.PIPE,
+          stdout=subprocess.PIPE,
+          encoding="utf-8",
+          start_new_session=True) as proc:
+        try:
+          stdout, _ = proc.communicate(input_, timeout=options["timeout"])
+        except BaseException:
+          # also on KeyboardInterrupt, the new session does not get the
+          # SIGINT of the terminal
+          kill_process_group(proc)
+          raise
+
+    return self._parse_output(stdout, input_, options)
+
+  def _parse_output(self, output: str, input_: str = None,
+                    options: Dict[str, Any] = None) -> Dict[str, SyntaxData]:
+    """Build SyntaxData objects from the json printed by verible
+
+    Raises:
+      ValueError: output is not valid json, e.g. verible crashed.
+    """
+    options = self._options(options)
 
-    json_data = json.loads(proc.stdout)
+    with Trace.span("verible.json_loads"):
+      json_data = json.loads(output)
+    Trace.count("verible json chars", len(output))
     data = {}
     for file_path, file_json in json_data.items():
       file_data = SyntaxData()
@@ -452,10 +1002,26 @@ class VeribleVerilogSyntax:
       else:
         with open(file_path, "rb") as f:
           file_data.source_code = f.read()
+      Trace.count("files parsed")
+      Trace.count("bytes read", len(file_data.source_code))
 
       if "tree" in file_json:
-        file_data.tree = VeribleVerilogSyntax._transform_tree(
-            file_json["tree"], file_data, options["skip_null"])
+        with Trace.span("verible.transform_tree"):
+          if options["tree_format"] == "json":
+            file_data.tree_json = file_json["tree"]
+          elif options["tree_format"] == "compact":
+            if "children" in file_json["tree"]:
+              file_data.tree = CompactTree(file_json["tree"], file_data,
+                                           options["skip_null"]).node(0)
+          else:
+            file_data.tree = VeribleVerilogSyntax._transform_tree(
+                file_json["tree"], file_data, options["skip_null"])
+        if Trace.enabled and file_data.tree is not None:
+          if options["tree_format"] == "compact":
+            Trace.count("syntax nodes", len(file_data.tree._tree.kinds))
+          else:
+            Trace.count("syntax nodes",
+                        sum(1 for _ in anytree.PreOrderIter(file_data.tree)))
 
       if "tokens" in file_json:
         file_data.tokens = VeribleVerilogSyntax._transform_tokens(
@@ -482,9 +1048,15 @@ class VeribleVerilogSyntax:
       options: dict with parsing options.
         Available options:
           gen_tree (boolean): whether to generate syntax tree.
+          tree_format (str): "node" (default) builds a Node tree in
+            ``tree``, "compact" stores the tree in a CompactTree and puts
+            its root view in ``tree``, "json" keeps the decoded json in
+            ``tree_json`` without creating any Node object.
           skip_null (boolean): null nodes won't be stored in a tree if True.
           gen_tokens (boolean): whether to generate tokens list.
           gen_rawtokens (boolean): whether to generate raw token list.
+          timeout (float): kill verible and raise subprocess.TimeoutExpired
+            after this many seconds, None (default) waits for it.
         By default only ``gen_tree`` is True.
 
     Returns:
@@ -501,9 +1073,15 @@ class VeribleVerilogSyntax:
       options: dict with parsing options.
         Available options:
           gen_tree (boolean): whether to generate syntax tree.
+          tree_format (str): "node" (default) builds a Node tree in
+            ``tree``, "compact" stores the tree in a CompactTree and puts
+            its root view in ``tree``, "json" keeps the decoded json in
+            ``tree_json`` without creating any Node object.
           skip_null (boolean): null nodes won't be stored in a tree if True.
           gen_tokens (boolean): whether to generate tokens list.
           gen_rawtokens (boolean): whether to generate raw token list.
+          timeout (float): kill verible and raise subprocess.TimeoutExpired
+            after this many seconds, None (default) waits for it.
         By default only ``gen_tree`` is True.
 
     Returns:
@@ -520,9 +1098,15 @@ class VeribleVerilogSyntax:
       options: dict with parsing options.
         Available options:
           gen_tree (boolean): whether to generate syntax tree.
+          tree_format (str): "node" (default) builds a Node tree in
+            ``tree``, "compact" stores the tree in a CompactTree and puts
+            its root view in ``tree``, "json" keeps the decoded json in
+            ``tree_json`` without creating any Node object.
           skip_null (boolean): null nodes won't be stored in a tree if True.
           gen_tokens (boolean): whether to generate tokens list.
           gen_rawtokens (boolean): whether to generate raw token list.
+          timeout (float): kill verible and raise subprocess.TimeoutExpired
+            after this many seconds, None (default) waits for it.
         By default only ``gen_tree`` is True.
 
     Returns:
@@ -1,19 +1,194 @@
 #!/usr/bin/env python3
 
-import glob
+import argparse
+import atexit
+import os
+import signal
+import sys
+import time
 
-from gen_uvm_block_diagram import *
+from gen_uvm_block_diagram import (BatchRender, Daemon, DrawClass, ParseCache, SourceDiscovery, SVClass,
+                                   SymbolIndex, TextMetrics, Trace, Watcher)
+from gen_uvm_block_diagram.parsers import backends, get_backend
 
 
-for file in glob.glob('./include/*'):
-    SVClass.parse_file(file)
-root_class = SVClass.classes['my_env']
+def region(s):
+    try:
+        x0, y0, x1, y1 = (int(v) for v in s.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected X0,Y0,X1,Y1, got {s}")
+    if x1 <= x0 or y1 <= y0:
+        raise argparse.ArgumentTypeError(f"empty region {s}")
+    return (x0, y0, x1, y1)
+
+
+parser = argparse.ArgumentParser(description="Generate UVM block diagram")
+parser.add_argument('files', nargs='*',
+                    help="systemverilog files, .f filelists or glob patterns to parse (default: ./include/*)")
+parser.add_argument('-f', '--filelist', action='append', default=[], help="read sources and +incdir+ from a filelist")
+parser.add_argument('-I', '--incdir', action='append', default=[], help="directory searched for `include files")
+parser.add_argument('-r', '--root', default='my_env', help="root class of the diagram")
+parser.add_argument('-b', '--backend', default=SVClass.backend, choices=list(backends),
+                    help="parser backend (default: $GEN_UVM_BACKEND, else verible)")
+parser.add_argument('--conformance', action='store_true',
+                    help="compare the lite backend with verible on the sources and exit")
+parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                    help="number of parallel parsing processes")
+parser.add_argument('--timeout', type=float,
+                    help="seconds verible may spend per file, files failing twice are skipped and reported")
+parser.add_argument('-o', '--output', help="write the diagram to this file instead of showing it")
+parser.add_argument('--path', help="draw the subtree at this path of class names from the root, e.g. my_env/master_agent")
+parser.add_argument('--zoom', type=region, metavar='X0,Y0,X1,Y1', help="draw this region of the diagram at full detail")
+parser.add_argument('--min-box', type=int, default=8,
+                    help="subtrees whose box is smaller than this many pixels are summarized")
+parser.add_argument('--font', help="truetype font of the labels (default: $GEN_UVM_FONT, else PIL builtin font)")
+parser.add_argument('--font-size', type=int, default=12, help="label font size, shrunk to fit small boxes")
+parser.add_argument('--batch', metavar='DIR',
+                    help="render every uvm_test/uvm_env class to DIR, with an index.html, and exit")
+parser.add_argument('--batch-format', default='png', help="file extension of the --batch diagrams")
+parser.add_argument('--unreferenced', action='store_true',
+                    help="with --batch, render the classes no other class references instead")
+parser.add_argument('--lazy', action='store_true', help="only parse the files reachable from the root class")
+parser.add_argument('--cache-dir', help="directory of the persistent parse cache")
+parser.add_argument('--cache-size', type=int, default=256, help="parse cache size limit in MB")
+parser.add_argument('--watch', action='store_true', help="re-parse changed files and re-render, until interrupted")
+parser.add_argument('--interval', type=float, default=0.2, help="watch polling interval in seconds")
+parser.add_argument('--serve', metavar='ADDRESS',
+                    help="keep the classes in memory and serve diagrams over http on [HOST:]PORT or on a unix socket path "
+                         "containing a /, "
+                         "with --watch changed files are re-parsed in the background")
+parser.add_argument('--print-tree', action='store_true', help="print the class tree and exit without drawing")
+parser.add_argument('--trace', metavar='FILE', help="write a chrome trace of the run stages to FILE")
+parser.add_argument('--metrics', metavar='FILE', help="write per-stage times and counters as json to FILE")
+args = parser.parse_args()
+if args.conformance and args.backend == 'tree_sitter':
+    # tree_sitter keeps parameters and declaration lists as written
+    parser.error("--conformance compares lite with verible, tree_sitter types and names differ")
+
+
+def render():
+    if args.font:
+        TextMetrics.font_path = args.font
+    tree = SVClass.classes[args.root].get_tree()
+    if args.path:
+        tree = DrawClass.sub_tree(tree, args.path)
+    dc = DrawClass(tree, font_size=args.font_size)
+    dc.min_box_size = args.min_box
+    dc.region = args.zoom
+    if args.output:
+        dc.save(args.output)
+    else:
+        dc.draw_tree()
+
+
+def discover():
+    """Sources of the command line filelists, files and patterns, run again
+    by the watcher when one of them changes"""
+    discovery = SourceDiscovery(args.incdir)
+    with Trace.span("discovery"):
+        for filelist in args.filelist:
+            discovery.add_filelist(filelist)
+        for file in Watcher(patterns).sources():
+            if file.endswith('.f'):
+                discovery.add_filelist(file)
+            else:
+                discovery.add(file)
+    for referrer, name, kind in discovery.missing:
+        if (referrer, name) not in reported:
+            reported.add((referrer, name))
+            what = f"`include \"{name}\"" if kind == "include" else f"{kind} {name}"
+            print(f"{referrer or 'command line'}: cannot find {what}", file=sys.stderr)
+    return discovery
+
+
+reported = set()
+
+
+def on_change(changed, removed):
+    start = time.time()
+    stale = SVClass.update_files(changed, removed, jobs=args.jobs, cache=cache)
+    SVClass.set_origins(watcher.discovery)
+    if args.root in stale and args.root in SVClass.classes:
+        render()
+    print(f"{len(changed)} changed, {len(removed)} removed, {len(stale)} classes updated "
+          f"in {1000*(time.time()-start):.0f} ms", file=sys.stderr)
+
+
+def write_trace():
+    if args.trace:
+        Trace.write_chrome_trace(args.trace)
+    if args.metrics:
+        Trace.write_metrics(args.metrics)
+
+
+if args.trace or args.metrics:
+    Trace.enable()
+    atexit.register(write_trace)
+SVClass.use_backend(args.backend)
+if args.timeout is not None:
+    get_backend('verible').timeout = args.timeout
+cache = ParseCache(args.cache_dir, args.cache_size*1024*1024) if args.cache_dir else None
+patterns = args.files or ([] if args.filelist else ['./include/*'])
+watcher = Watcher(args.filelist + patterns, args.interval, discover)
+discovery = watcher.discovery
+if args.conformance:
+    checked, rejected, mismatches = get_backend('lite').conformance(
+        discovery.sources(), SVClass.exclude, args.jobs)
+    for file, lite_classes, verible_classes in mismatches:
+        print(f"{file}:\n  lite:    {lite_classes}\n  verible: {verible_classes}")
+    print(f"{checked} files checked against verible, {len(mismatches)} mismatches, "
+          f"{rejected} files left to the fallback backend")
+    sys.exit(1 if mismatches else 0)
+if args.lazy and not (args.batch or args.serve):
+    SVClass.parse_reachable(args.root, SymbolIndex(discovery.sources()), jobs=args.jobs, cache=cache)
+else:
+    SVClass.parse_files(discovery.sources(), jobs=args.jobs, cache=cache)
+SVClass.set_origins(discovery)
+for file, error in getattr(SVClass.get_parser(), "errors", {}).items():
+    print(f"{file}: skipped, {error}", file=sys.stderr)
+if cache:
+    print(cache.report(), file=sys.stderr)
+if args.batch:
+    if args.font:
+        TextMetrics.font_path = args.font
+    batch = BatchRender(args.batch, args.batch_format, args.jobs, args.font_size)
+    results = batch.run(BatchRender.roots(SVClass.classes, args.unreferenced))
+    for root, path, error in results:
+        if error:
+            print(f"{root}: {error}", file=sys.stderr)
+    print(f"{len(results)} diagrams written to {args.batch}", file=sys.stderr)
+    sys.exit(1 if any(error for _, _, error in results) else 0)
+if args.serve:
+    if args.font:
+        TextMetrics.font_path = args.font
+    daemon = Daemon(watcher, args.jobs, cache, args.font_size, args.min_box, verbose=True)
+    if args.watch:
+        daemon.watch()
+    # exit through serve() on SIGTERM too, it removes its unix socket
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        daemon.serve(args.serve)
+    except KeyboardInterrupt:
+        pass
+    except (OSError, ValueError) as e:
+        sys.exit(f"--serve: {e}")
+    sys.exit(0)
+root_class = SVClass.classes[args.root]
 
 # for file in glob.glob('../uvm_code_gen/output/**/*.sv', recursive=True):
 #     SVClass.parse_file(file)
 # root_class = SVClass.classes['top_env']
 
 root_class.print_tree()
+if args.print_tree:
+    sys.exit(0)
 
-dc = DrawClass(root_class.get_tree())
-dc.draw_tree()
+if args.watch:
+    args.output = args.output or 'diagram.png'
+    render()
+    try:
+        watcher.run(on_change)
+    except KeyboardInterrupt:
+        pass
+else:
+    render()
@@ -0,0 +1,66 @@
+// constructs of drivers, monitors, scoreboards and sequences the lite
+// parser handles like verible, see tests/test_lite.py
+interface dut_if(input bit clk);
+  logic rst_n;
+  modport mon_mp(input clk, rst_n);
+endinterface
+
+class vif_driver extends uvm_driver #(my_item);
+  `uvm_component_utils(vif_driver)
+
+  virtual dut_if vif;
+  virtual interface dut_if vif2;
+  protected virtual dut_if.mon_mp mon_vif, mon_vif2;
+  virtual dut_if #(.WIDTH(8)) wide_vif;
+
+  function new(string name, uvm_component parent);
+    super.new(name, parent);
+  endfunction
+
+  virtual function void build_phase(uvm_phase phase);
+    if (!uvm_config_db #(virtual dut_if)::get(this, "", "vif", vif))
+      `uvm_error("", "no vif")
+  endfunction
+
+  extern virtual task drive(my_item item);
+endclass
+
+class local_scoreboard extends uvm_scoreboard;
+  `uvm_component_utils(local_scoreboard)
+
+  my_item exp_q[$];
+
+  function void write(my_item pkt);
+    my_item cur, prev;
+    int n;
+    automatic my_item tmp = new();
+    my_item::type_id::set_type_override(my_item_ext::get_type());
+    cur = pkt;
+    if (exp_q.size())
+    begin
+      n = 1;
+    end
+  endfunction
+
+  task run_phase(uvm_phase phase);
+    my_cfg #(2) cfg;
+    forever begin
+      @(posedge vif.clk);
+      fork
+        n++;
+      join_none
+    end
+  endtask
+endclass
+
+class local_sequence extends uvm_sequence #(my_item);
+  `uvm_object_utils(local_sequence)
+
+  task body;
+    my_item req;
+    repeat (4) begin
+      start_item(req);
+      finish_item(req);
+    end
+  endtask
+endclass
@@ -0,0 +1,74 @@
+import errno
+import http.client
+import os
+import socket
+import threading
+
+import pytest
+
+from gen_uvm_block_diagram import Daemon, Watcher
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX)
+        self.sock.connect(self.path)
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    return Daemon(Watcher([str(tmp_path / "*.sv")]))
+
+
+def serve(daemon, address):
+    thread = threading.Thread(target=daemon.serve, args=(address,), daemon=True)
+    thread.start()
+    while daemon.server is None or not os.path.exists(address):
+        thread.join(0.01)
+        assert thread.is_alive()
+    return thread
+
+
+def test_tree_without_root(daemon):
+    assert daemon.handle("/tree?format=txt")[0] == 400
+    assert daemon.handle("/tree?root=missing")[0] == 404
+
+
+@pytest.mark.parametrize("address", ["localhost", "host:http", "daemon.sock"])
+def test_bad_address(daemon, tmp_path, monkeypatch, address):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(ValueError):
+        daemon.serve(address)
+    assert os.listdir(tmp_path) == []
+
+
+def test_refuse_regular_file(daemon, tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("kept")
+    with pytest.raises(FileExistsError):
+        daemon.serve(str(path))
+    assert path.read_text() == "kept"
+
+
+def test_stale_socket(daemon, tmp_path):
+    path = str(tmp_path / "daemon.sock")
+    with socket.socket(socket.AF_UNIX) as s:
+        s.bind(path)
+    thread = serve(daemon, path)
+    conn = UnixHTTPConnection(path)
+    conn.request("GET", "/roots")
+    assert conn.getresponse().status == 200
+    conn.close()
+
+    # a second daemon does not take over the live socket
+    with pytest.raises(OSError) as e:
+        Daemon(daemon.watcher).serve(path)
+    assert e.value.errno == errno.EADDRINUSE
+
+    daemon.server.shutdown()
+    thread.join()
+    assert not os.path.exists(path)
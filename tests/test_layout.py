@@ -0,0 +1,84 @@
+from collections import OrderedDict
+
+from gen_uvm_block_diagram import Layout
+
+TYPE_POSITION = {"uvm_test": "middle", "uvm_env": "middle", "uvm_agent": "middle",
+                 "uvm_monitor": "middle", "uvm_driver": "middle"}
+
+
+def node(name, type, properties=()):
+    return {"name": name, "type": type, "properties": list(properties)}
+
+
+def agent(i):
+    return node(f"agent_{i}", "uvm_agent", [node("mon", "uvm_monitor"), node("drv", "uvm_driver"),
+                                            node("port", "uvm_analysis_port")])
+
+
+def test_count_when_summaries_do_not_fit():
+    # 64 leaf envs of 17 px, each holding 80 agents
+    envs = [node(f"env_{i}", "uvm_env", [agent(j) for j in range(80)]) for i in range(64)]
+    tree = [node("test", "uvm_test", envs)]
+    for min_size in (8, 0):
+        layout = Layout(1920, 1080, 10, TYPE_POSITION, min_size)
+        layout.place(tree)
+        children = layout.children()
+        leaves = [i for i in range(len(layout)) if layout.type(i) == "uvm_env"]
+        assert len(leaves) == 64
+        for i in leaves:
+            assert children[i] == []
+            # 80 agents with 3 children each
+            assert layout.names[i].endswith(" (+320)")
+
+
+def test_count_below_min_size():
+    tree = [node("env", "uvm_env", [agent(0)])]
+    layout = Layout(60, 1080, 10, TYPE_POSITION, min_size=45)
+    layout.place(tree)
+    names = [layout.names[i] for i, _ in layout.pre_order()]
+    assert names == ["env", "agent_0 (+3)"]
+
+
+def uvm_testbench(nb_envs=3, nb_agents=4):
+    envs = [node(f"env_{i}", "uvm_env", [node("sb", "uvm_scoreboard", [node("imp", "uvm_analysis_imp")])]
+                 + [agent(j) for j in range(nb_agents)]) for i in range(nb_envs)]
+    return [node("test", "uvm_test", envs + [node("cfg", "test_cfg")])]
+
+
+def recursive_boxes(layout, tree, parent_coords=None, depth=0):
+    """(depth, name, coords) drawn by the recursive renderer the flat
+    layout replaced"""
+    is_root = parent_coords is None
+    if is_root:
+        parent_coords = ((0, 0), (layout.w-1, layout.h-1))
+    boxes = []
+    coords = layout.get_sibling_coords(parent_coords, tree, no_margin=is_root)
+    for sibling, c in zip(tree, coords):
+        boxes.append((depth, sibling['name'], c))
+        boxes += recursive_boxes(layout, sibling['properties'], c, depth + 1)
+    return boxes
+
+
+def test_same_as_recursive():
+    type_position = dict(TYPE_POSITION, uvm_scoreboard="top")
+    for tree in (uvm_testbench(), uvm_testbench(1, 1), uvm_testbench(7, 3)):
+        layout = Layout(1920, 1080, 10, type_position)
+        layout.place(tree)
+        assert [(depth, layout.names[i], layout.coords(i)) for i, depth in layout.pre_order()] == \
+            recursive_boxes(layout, tree)
+
+
+def test_cache(monkeypatch):
+    monkeypatch.setattr(Layout, "cache", OrderedDict())
+    layout = Layout.compute(uvm_testbench(), 1920, 1080, 10, TYPE_POSITION)
+    # an identical tree built again
+    assert Layout.compute(uvm_testbench(), 1920, 1080, 10, TYPE_POSITION) is layout
+    changed = uvm_testbench()
+    changed[0]["properties"][1]["properties"][2]["properties"].append(node("cov", "uvm_subscriber"))
+    assert Layout.compute(changed, 1920, 1080, 10, TYPE_POSITION) is not layout
+    renamed = uvm_testbench()
+    renamed[0]["properties"][0]["properties"][0]["name"] = "scoreboard"
+    assert Layout.compute(renamed, 1920, 1080, 10, TYPE_POSITION) is not layout
+    assert Layout.compute(uvm_testbench(), 1920, 1080, 10, dict(TYPE_POSITION, uvm_agent="top")) is not layout
+    assert len(Layout.cache) == 4
+    assert Layout.compute(uvm_testbench(), 1920, 1080, 10, TYPE_POSITION) is layout
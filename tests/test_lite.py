@@ -0,0 +1,98 @@
+import glob
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from gen_uvm_block_diagram.parsers import get_backend
+from gen_uvm_block_diagram.parsers.lite import LiteParser, SVFileParser, Unsupported
+
+from .test_verible import recorded_classes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES = sorted(glob.glob(os.path.join(ROOT, "include", "*")))
+FIXTURE = os.path.join(ROOT, "tests", "fixtures", "uvm_constructs.sv")
+
+# what verible extracts from the fixture: virtual interfaces are properties
+# of the interface type, declarations of method bodies come after the
+# class-scope ones
+FIXTURE_CLASSES = [
+    {"name": "vif_driver", "type": "uvm_driver", "properties": [
+        ("dut_if", "vif"), ("dut_if", "vif2"), ("dut_if", "mon_vif"),
+        ("dut_if", "mon_vif2"), ("dut_if", "wide_vif")]},
+    {"name": "local_scoreboard", "type": "uvm_scoreboard", "properties": [
+        ("my_item", "exp_q"), ("my_item", "cur"), ("my_item", "prev"),
+        ("my_item", "tmp"), ("my_cfg", "cfg")]},
+    {"name": "local_sequence", "type": "uvm_sequence", "properties": [
+        ("my_item", "req")]},
+]
+
+
+def verible_available():
+    return shutil.which(get_backend("verible").parser.executable) is not None
+
+
+@pytest.mark.parametrize("path", SOURCES, ids=os.path.basename)
+def test_samples_accepted(path):
+    p = SVFileParser(path, [])
+    assert p.reason is None
+
+
+def test_fixture():
+    assert SVFileParser(FIXTURE, []).classes == FIXTURE_CLASSES
+
+
+def test_fixture_recorded_verible():
+    # conformance without the binary, on the json verible printed for the
+    # fixture
+    assert recorded_classes("json") == FIXTURE_CLASSES
+
+
+def test_sample_properties():
+    classes = {c["name"]: c for f in SOURCES for c in SVFileParser(f, []).classes}
+    assert ("dut_if", "vif") in classes["master_driver"]["properties"]
+    assert classes["my_monitor"]["properties"][-3:] == [
+        ("my_transaction", "rx"), ("my_transaction", "tx"), ("my_transaction", "toto")]
+    assert classes["my_scoreboard"]["properties"][-1] == ("my_transaction", "cur_pkt")
+    assert classes["master_sequence"]["properties"] == [("my_transaction", "req")]
+
+
+@pytest.mark.parametrize("body", [
+    "begin\n      my_item nested;\n    end",
+    "fork\n      my_item nested;\n    join",
+    "pkg::my_item scoped;",
+    "my_item item = my_item::type_id::create(\"item\");",
+    "bit [W-1:0] data;",
+])
+def test_rejected_in_method(body):
+    src = f"class c;\n  task t;\n    {body}\n  endtask\nendclass\n"
+    with pytest.raises(Unsupported):
+        LiteParser(src).parse()
+
+
+def test_missing_fallback(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_backend("verible").parser, "executable", str(tmp_path / "missing"))
+    rejected = tmp_path / "rejected.sv"
+    rejected.write_text("class c;\n  `ifdef X\n  int a;\n  `endif\nendclass\n")
+    paths = [SOURCES[0], str(rejected)]
+    results = SVFileParser.parse_files(paths, [])
+    assert list(results) == [SOURCES[0]]
+    assert "`ifdef in class scope" in SVFileParser.errors[str(rejected)]
+    assert SVFileParser(str(rejected), []).parse_classes() is None
+
+
+@pytest.mark.skipif(not verible_available(), reason="verible-verilog-syntax not available")
+def test_conformance():
+    checked, rejected, mismatches = SVFileParser.conformance(SOURCES + [FIXTURE], [])
+    assert rejected == 0
+    assert mismatches == []
+
+
+def test_conformance_reference():
+    # tree_sitter types keep their parameters, e.g. my_monitor#(0)
+    proc = subprocess.run([sys.executable, os.path.join(ROOT, "main.py"), "--conformance", "-b", "tree_sitter",
+                           SOURCES[0]], stderr=subprocess.PIPE, encoding="utf-8", check=False)
+    assert proc.returncode == 2
+    assert "compares lite with verible" in proc.stderr
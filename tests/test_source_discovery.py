@@ -0,0 +1,87 @@
+import os
+
+from gen_uvm_block_diagram import SourceDiscovery, Watcher
+
+
+def write(path, text=""):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path)
+
+
+def test_filelist_options(tmp_path):
+    top = write(tmp_path / "tb_top.sv", '`include "pkg.svh"\n')
+    write(tmp_path / "inc" / "pkg.svh")
+    lib = write(tmp_path / "lib.sv")
+    filelist = write(tmp_path / "run.f", f"""
+        -timescale 1ns/1ps
+        -top tb
+        -l run.log
+        +define+X=1
+        +incdir+{tmp_path / "inc"}
+        -sv {top}
+        -v {lib}
+        {tmp_path / "missing.sv"}
+        -f {tmp_path / "missing.f"}
+    """)
+    d = SourceDiscovery()
+    d.add_filelist(filelist)
+    assert d.sources() == [top, os.path.join(str(tmp_path / "inc"), "pkg.svh")]
+    assert d.missing == [(filelist, str(tmp_path / "missing.sv"), "source"),
+                         (filelist, str(tmp_path / "missing.f"), "filelist")]
+    assert d.filelists == [filelist, str(tmp_path / "missing.f")]
+
+
+def test_missing_include(tmp_path):
+    top = write(tmp_path / "top.sv", '`include "absent.svh"\n')
+    d = SourceDiscovery()
+    d.add(top)
+    d.add(str(tmp_path / "absent.sv"))
+    assert d.sources() == [top]
+    assert d.missing == [(top, "absent.svh", "include"), (None, str(tmp_path / "absent.sv"), "source")]
+
+
+def discover_from(tmp_path, filelist):
+    def discover():
+        d = SourceDiscovery()
+        d.add_filelist(filelist)
+        for file in Watcher([str(tmp_path / "src" / "*.sv")]).sources():
+            d.add(file)
+        return d
+    return discover
+
+
+def test_watcher_rediscovers(tmp_path):
+    a = write(tmp_path / "src" / "a.sv", "class a; endclass\n")
+    b = write(tmp_path / "other" / "b.sv", "class b; endclass\n")
+    filelist = write(tmp_path / "run.f", "")
+    watcher = Watcher([filelist, str(tmp_path / "src" / "*.sv")], discover=discover_from(tmp_path, filelist))
+    assert watcher.discovery.sources() == [a]
+    assert watcher.poll() == ([], [])
+
+    # a new file matching a pattern
+    c = write(tmp_path / "src" / "c.sv", "class c; endclass\n")
+    assert watcher.poll() == ([c], [])
+
+    # a new filelist entry
+    write(tmp_path / "run.f", f"-sv {b}\n")
+    assert watcher.poll() == ([b], [])
+
+    # a new `include
+    write(tmp_path / "other" / "inc.svh", "class i; endclass\n")
+    write(tmp_path / "src" / "a.sv", '`include "../other/inc.svh"\nclass a; endclass\n')
+    assert watcher.poll() == ([a, str(tmp_path / "src" / "../other/inc.svh")], [])
+
+    # entry removed from the filelist, file still there
+    write(tmp_path / "run.f", "")
+    assert watcher.poll() == ([], [b])
+
+
+def test_watcher_patterns(tmp_path):
+    a = write(tmp_path / "a.sv", "class a; endclass\n")
+    watcher = Watcher([str(tmp_path / "*.sv")])
+    write(tmp_path / "a.sv", "class a; int x; endclass\n")
+    b = write(tmp_path / "b.sv")
+    assert watcher.poll() == ([a, b], [])
+    os.unlink(a)
+    assert watcher.poll() == ([], [a])
@@ -0,0 +1,128 @@
+import random
+
+import pytest
+
+from gen_uvm_block_diagram import SVClass
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(SVClass, "classes", {})
+    monkeypatch.setattr(SVClass, "files", {})
+    monkeypatch.setattr(SVClass, "_nodes", {})
+    monkeypatch.setattr(SVClass, "backend", SVClass.backend)
+    monkeypatch.setattr(SVClass, "parser", SVClass.parser)
+
+
+def add(name, type, *properties):
+    SVClass.add_classes([{"name": name, "type": type,
+                          "properties": [(p, f"m_{i}") for i, p in enumerate(properties)]}])
+
+
+def recursive_tree(c, level=0):
+    """get_tree() before the shared nodes, depth-limited instead of
+    detecting cycles"""
+    if c.name in SVClass.exclude or c.type in SVClass.exclude:
+        return []
+    prop_trees = []
+    for p in c.properties:
+        if p[0] in SVClass.classes and level < 10:
+            prop_trees += recursive_tree(SVClass.classes[p[0]], level + 1)
+        else:
+            prop_trees += [{'name': p[0], 'type': p[0], 'properties': []}]
+    return [{'name': c.name, 'type': c.type, 'properties': prop_trees}]
+
+
+def leaf(name):
+    return {"name": name, "type": name, "properties": []}
+
+
+def test_self_reference():
+    add("node_c", "uvm_component", "node_c", "int_c")
+    assert SVClass.classes["node_c"].get_tree() == [
+        {"name": "node_c", "type": "uvm_component", "properties": [leaf("node_c"), leaf("int_c")]}]
+
+
+def test_mutual_recursion():
+    add("a", "uvm_env", "b")
+    add("b", "uvm_agent", "a")
+    assert SVClass.classes["a"].get_tree() == [
+        {"name": "a", "type": "uvm_env", "properties": [
+            {"name": "b", "type": "uvm_agent", "properties": [leaf("a")]}]}]
+    # nodes inside the cycle depend on where it is entered, none is kept
+    assert SVClass._nodes == {}
+    assert SVClass.classes["b"].get_tree() == [
+        {"name": "b", "type": "uvm_agent", "properties": [
+            {"name": "a", "type": "uvm_env", "properties": [leaf("b")]}]}]
+
+
+def test_cycle_below_shared_node():
+    add("top", "uvm_env", "loop", "drv")
+    add("loop", "uvm_agent", "loop", "drv")
+    add("drv", "uvm_driver")
+    tree = SVClass.classes["top"].get_tree()
+    loop, drv = tree[0]["properties"]
+    assert loop["properties"] == [leaf("loop"), drv]
+    assert loop["properties"][1] is drv
+
+
+def test_shared_subtree():
+    add("env", "uvm_env", "agent", "agent", "sb")
+    add("agent", "uvm_agent", "mon", "drv")
+    add("mon", "uvm_monitor")
+    add("drv", "uvm_driver")
+    add("sb", "uvm_scoreboard", "mon")
+    tree = SVClass.classes["env"].get_tree()
+    a0, a1, sb = tree[0]["properties"]
+    assert a0 is a1
+    assert sb["properties"][0] is a0["properties"][0]
+    # and from one get_tree() to the next
+    assert SVClass.classes["agent"].get_tree()[0] is a0
+    assert SVClass.expand_tree(tree) == recursive_tree(SVClass.classes["env"])
+
+
+def test_excluded():
+    add("env", "uvm_env", "seq", "agent")
+    add("seq", "uvm_sequence")
+    add("agent", "uvm_agent")
+    assert SVClass.classes["env"].get_tree() == recursive_tree(SVClass.classes["env"])
+    assert SVClass.classes["seq"].get_tree() == []
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_same_as_recursive(seed):
+    # random DAGs: properties only point to classes of higher index
+    rnd = random.Random(seed)
+    n = 30
+    for i in range(n):
+        properties = [f"c{rnd.randrange(i + 1, n + 3)}" for _ in range(rnd.randrange(4))] if i < n - 1 else []
+        add(f"c{i}", rnd.choice(["uvm_env", "uvm_agent", "uvm_object"]), *properties)
+    for name, c in SVClass.classes.items():
+        assert c.get_tree() == recursive_tree(c), name
+
+
+def test_update_files(tmp_path):
+    SVClass.use_backend("lite")
+    agent = tmp_path / "agent.sv"
+    env = tmp_path / "env.sv"
+    other = tmp_path / "other.sv"
+    agent.write_text("class my_agent extends uvm_agent;\n  my_driver drv;\nendclass\n")
+    env.write_text("class my_env extends uvm_env;\n  my_agent agent;\nendclass\n")
+    other.write_text("class other_env extends uvm_env;\n  my_driver drv;\nendclass\n")
+    SVClass.parse_files([str(agent), str(env), str(other)])
+    before = SVClass.classes["my_env"].get_tree()
+    other_tree = SVClass.classes["other_env"].get_tree()
+    assert before[0]["properties"][0]["properties"] == [leaf("my_driver")]
+
+    agent.write_text("class my_agent extends uvm_agent;\n  my_monitor mon;\nendclass\n")
+    stale = SVClass.update_files([str(agent)])
+    assert stale == {"my_agent", "my_env"}
+    after = SVClass.classes["my_env"].get_tree()
+    assert after[0]["properties"][0]["properties"] == [leaf("my_monitor")]
+    assert after[0] is not before[0]
+    # classes not reaching the changed file keep their nodes
+    assert SVClass.classes["other_env"].get_tree()[0] is other_tree[0]
+
+    stale = SVClass.update_files([], [str(agent)])
+    assert stale == {"my_agent", "my_env"}
+    assert SVClass.classes["my_env"].get_tree()[0]["properties"] == [leaf("my_agent")]
@@ -0,0 +1,115 @@
+import glob
+import os
+import random
+
+import pytest
+
+pytest.importorskip("tree_sitter")
+
+from gen_uvm_block_diagram.parsers.tree_sitter import SVFileParser
+
+INCLUDE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "include")
+SOURCES = sorted(glob.glob(os.path.join(INCLUDE, "*")))
+
+
+@pytest.fixture(scope="module", autouse=True)
+def grammar():
+    # the grammar library is $TREE_SITTER_VERILOG
+    try:
+        SVFileParser.load()
+    except (OSError, AttributeError) as e:
+        pytest.skip(f"verilog grammar not available: {e}")
+
+
+def parse(tmp_path, text, name="a.sv"):
+    path = tmp_path / name
+    path.write_bytes(text)
+    return SVFileParser(str(path), [])
+
+
+def reference_classes(p):
+    """One query per class, the way classes were extracted before the
+    combined class.all query"""
+    classes = []
+    for node_class, _ in p.query["class"].captures(p.root_node):
+        class_info = {"name": "", "type": "", "properties": []}
+        c = p.query["class.name"].captures(node_class)
+        class_info["name"] = p.node_str(c[0][0]) if c else ""
+        c = p.query["class.type"].captures(node_class)
+        class_info["type"] = p.node_str(c[0][0]) if c else ""
+        type = None
+        for node, capture_name in p.query["class.property"].captures(node_class):
+            if capture_name == "class.property.type":
+                type = p.node_str(node)
+            else:
+                class_info["properties"].append([type, p.node_str(node)])
+        classes.append(class_info)
+    return classes
+
+
+@pytest.mark.parametrize("path", SOURCES, ids=os.path.basename)
+def test_combined_query(path):
+    p = SVFileParser(path, [])
+    assert p.parse_classes() == reference_classes(p)
+
+
+def test_combined_query_nested(tmp_path):
+    p = parse(tmp_path, b"class outer extends uvm_env;\n  my_env e;\n"
+                        b"  class inner extends uvm_agent;\n    my_driver d;\n  endclass\n"
+                        b"  int n;\nendclass\n")
+    assert p.parse_classes() == reference_classes(p)
+
+
+PKG = open(os.path.join(INCLUDE, "my_testbench_pkg.svh"), "rb").read()
+SLAVE = PKG.index(b"class slave_agent")
+SLAVE_END = PKG.index(b"endclass", SLAVE)
+ENV = PKG.index(b"class my_env")
+
+EDITS = {
+    "insert property": (PKG.index(b"slave_driver   s_driver;"),) * 2 + (b"int added;\n    ",),
+    "insert class": (SLAVE, SLAVE, b"class inserted extends uvm_env;\n  my_env e;\nendclass\n\n"),
+    "delete class": (SLAVE, SLAVE_END + len(b"endclass"), b""),
+    "rename type": (PKG.index(b"uvm_agent", SLAVE), PKG.index(b"uvm_agent", SLAVE) + 9, b"uvm_component"),
+    "split across classes": (SLAVE_END - 5, ENV + 8, b"\nendclass\nclass merged extends uvm_env;\n"),
+    "merge classes": (SLAVE_END, ENV + len(b"class my_env extends uvm_env;"), b""),
+    "insert at start": (0, 0, b"class first; int a; endclass\n"),
+    "delete at end": (len(PKG) - 20, len(PKG), b""),
+    "multibyte": (SLAVE, SLAVE, "// éé\n".encode("utf8")),
+}
+
+
+@pytest.mark.parametrize("start, end, new", EDITS.values(), ids=EDITS.keys())
+def test_edit(tmp_path, start, end, new):
+    p = parse(tmp_path, PKG)
+    p.classes()
+    classes = p.edit(start, end, new)
+    text = PKG[:start] + new + PKG[end:]
+    assert p.src_code == text
+    assert classes == parse(tmp_path, text, "b.sv").parse_classes()
+
+
+def test_edit_sequence(tmp_path):
+    # records shifted by one edit must be right for the next ones
+    snippets = [b"", b"int x;\n", b"endclass\n", b"class z extends uvm_env;\n my_env e;\n",
+                b"class q; int a, b; endclass\n", b"my_env", b";"]
+    sources = [open(f, "rb").read() for f in SOURCES]
+    rnd = random.Random(0)
+    for _ in range(40):
+        text = rnd.choice(sources)
+        p = parse(tmp_path, text)
+        p.classes()
+        for _ in range(5):
+            start = rnd.randrange(len(text) + 1)
+            end = min(len(text), start + rnd.choice([0, 1, 5, 20, 200]))
+            new = rnd.choice(snippets)
+            classes = p.edit(start, end, new)
+            text = text[:start] + new + text[end:]
+            assert classes == parse(tmp_path, text, "b.sv").parse_classes()
+
+
+def test_parse_files_jobs():
+    # chunks are parsed in worker processes, results come back in order
+    serial = SVFileParser.parse_files(SOURCES, [], jobs=1)
+    parallel = SVFileParser.parse_files(SOURCES, [], jobs=2)
+    assert list(parallel) == SOURCES
+    assert parallel == serial
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import subprocess
+import time
+
+import pytest
+
+from gen_uvm_block_diagram.parsers import get_backend
+
+SVFileParser = get_backend("verible")
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIXTURE = os.path.join(FIXTURES, "uvm_constructs.sv")
+
+# stands in for verible: a wrapper script whose child outlives it unless
+# the whole process group is killed, it prints an empty entry per file
+STUB = """#!/bin/sh
+printf '{'
+sep=
+for a in "$@"; do
+  case "$a" in
+    -*) continue;;
+    *slow*) sleep 30 & echo $! > "$0.pid"; wait;;
+    *crash*) exit 3;;
+  esac
+  printf '%s"%s": {}' "$sep" "$a"
+  sep=,
+done
+echo '}'
+"""
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    path = tmp_path / "verible-verilog-syntax"
+    path.write_text(STUB)
+    path.chmod(0o755)
+    monkeypatch.setattr(SVFileParser.parser, "executable", str(path))
+    monkeypatch.setattr(SVFileParser, "errors", {})
+    files = {}
+    for name in ("ok.sv", "slow.sv", "crash.sv"):
+        files[name] = tmp_path / name
+        files[name].write_text("")
+    return files
+
+
+def running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_parse_timeout(stub):
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        SVFileParser.parser.parse_files([str(stub["slow.sv"])], {"timeout": 0.5})
+    assert time.monotonic() - start < 10
+    with open(SVFileParser.parser.executable + ".pid") as f:
+        pid = int(f.read())
+    # the child of the wrapper went with it
+    for _ in range(100):
+        if not running(pid):
+            break
+        time.sleep(0.01)
+    assert not running(pid)
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_parse_files_async(stub, jobs):
+    paths = [str(p) for p in stub.values()]
+    start = time.monotonic()
+    results = asyncio.run(SVFileParser.parse_files_async(paths, [], jobs, timeout=0.5, retries=0))
+    assert time.monotonic() - start < 10
+    # the stub prints no syntax tree
+    assert results == {paths[0]: None}
+    assert sorted(SVFileParser.errors) == sorted(paths[1:])
+    assert "timed out" in SVFileParser.errors[paths[1]]
+    assert "JSONDecodeError" in SVFileParser.errors[paths[2]]
+
+
+def test_broken_pool(stub, tmp_path, monkeypatch):
+    extract = SVFileParser.extract
+
+    def extract_or_die(cls, paths, output, options, exclude):
+        # the worker dies the first time it gets boom.sv
+        marker = paths[0] + ".died"
+        if paths[0].endswith("boom.sv") and not os.path.exists(marker):
+            open(marker, "w").close()
+            os._exit(1)
+        return extract(paths, output, options, exclude)
+
+    monkeypatch.setattr(SVFileParser, "extract", classmethod(extract_or_die))
+    paths = [str(stub["ok.sv"])]
+    for name in ("boom.sv", "ok_1.sv", "ok_2.sv"):
+        paths.append(str(tmp_path / name))
+        # not empty, each file gets its chunk
+        with open(paths[-1], "w") as f:
+            f.write("\n")
+    results = asyncio.run(SVFileParser.parse_files_async(paths, [], 2, retries=1))
+    assert list(results) == paths
+    assert SVFileParser.errors == {}
+
+
+def test_parse_files_chunks(stub, tmp_path, monkeypatch):
+    paths = [str(stub["crash.sv"])]
+    for i in range(5):
+        paths.append(str(tmp_path / f"ok_{i}.sv"))
+        open(paths[-1], "w").close()
+    calls = []
+    parse_files = SVFileParser.parser.parse_files
+    monkeypatch.setattr(SVFileParser.parser, "parse_files",
+                        lambda paths, options: calls.append(paths) or parse_files(paths, options))
+    monkeypatch.setattr(SVFileParser, "max_chunk_files", 2)
+    results = SVFileParser.parse_files(paths, [])
+    assert list(results) == paths[1:]
+    assert list(SVFileParser.errors) == [paths[0]]
+    assert "JSONDecodeError" in SVFileParser.errors[paths[0]]
+    assert max(len(c) for c in calls) == 2
+    # the chunk of crash.sv is parsed again one file at a time
+    assert [paths[0]] in calls
+
+
+def recorded_data(tree_format):
+    """SyntaxData of the fixture built from the json verible printed for it
+
+    Recorded with verible-verilog-syntax -export_json -printtree, run from
+    the repository root.
+    """
+    with open(FIXTURE + ".json") as f:
+        output = json.dumps({FIXTURE: json.load(f)["tests/fixtures/uvm_constructs.sv"]})
+    return SVFileParser.parser._parse_output(output, None, {"tree_format": tree_format})[FIXTURE]
+
+
+def recorded_classes(tree_format):
+    return SVFileParser(FIXTURE, [], recorded_data(tree_format)).parse_classes()
+
+
+def test_node_and_json_formats():
+    classes = recorded_classes("json")
+    assert [c["name"] for c in classes] == ["vif_driver", "local_scoreboard", "local_sequence"]
+    assert ("my_item", "exp_q") in classes[1]["properties"]
+    assert recorded_classes("node") == classes
+
+
+def test_compact_format():
+    assert recorded_classes("compact") == recorded_classes("node")
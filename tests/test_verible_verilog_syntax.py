@@ -0,0 +1,49 @@
+import anytree
+import pytest
+
+from gen_uvm_block_diagram.parsers.verible_verilog_syntax import (
+    BranchNode, LevelOrderTreeIterator, PreOrderTreeIterator, TokenNode)
+
+from .test_verible import recorded_data
+
+TAGS = [["kDataDeclaration"], ["SymbolIdentifier", "EscapedIdentifier"],
+        ["kClassHeader", "kExtendsList", "SymbolIdentifier"], ["kMissing"]]
+
+
+@pytest.fixture
+def tree():
+    return recorded_data("node").tree
+
+
+def scanned(node, tags, iter_):
+    return [n for n in iter_(node) if getattr(n, "tag", None) in tags]
+
+
+def check_index(tree):
+    for node in [tree] + tree.find_all({"tag": ["kClassDeclaration", "kClassItems", "kDataDeclaration"]}):
+        for tags in TAGS:
+            assert node.find_all({"tag": tags}) == scanned(node, tags, anytree.LevelOrderIter)
+            assert node.find_all({"tag": tags}, iter_=PreOrderTreeIterator) == \
+                scanned(node, tags, anytree.PreOrderIter)
+
+
+def test_index_order(tree):
+    check_index(tree)
+    assert tree._tag_index is not None
+    assert len(tree.find_all({"tag": "kDataDeclaration"}, max_count=2)) == 2
+
+
+def test_index_invalidated(tree):
+    tree.tag_index
+    decl = tree.find({"tag": "kDataDeclaration"})
+    decl.parent = None
+    assert tree._tag_index is None
+    assert decl not in tree.find_all({"tag": "kDataDeclaration"})
+    check_index(tree)
+
+    items = tree.find({"tag": "kClassItems"})
+    added = BranchNode("kDataDeclaration", parent=items,
+                       children=[TokenNode("SymbolIdentifier", 0, 5)])
+    assert tree._tag_index is None
+    assert added in tree.find_all({"tag": "kDataDeclaration"}, iter_=LevelOrderTreeIterator)
+    check_index(tree)